@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import json
+import html
 import os
 import random
 from datetime import datetime, timedelta
@@ -9,6 +11,20 @@ import time
 from dotenv import load_dotenv
 import re
 import io
+import asyncio
+import threading
+import concurrent.futures
+import bisect
+import itertools
+import csv
+import codecs
+import sys
+import sqlite3
+import hashlib
+import uuid
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
 
 # Load environment variables from .env file if present
 load_dotenv()
@@ -21,18 +37,414 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Model used for all Claude requests
+CLAUDE_MODEL = "claude-3-haiku-20240307"
+
+# Optional alternative Messages API endpoint, e.g. a local stub server for testing
+CLAUDE_BASE_URL = os.environ.get("CLAUDE_BASE_URL") or None
+
+# Directory for data kept between sessions, such as submitted message batches
+DATA_DIR = os.environ.get("OUTREACH_DATA_DIR", ".outreach")
+
+# Shared Claude clients, cached per API key across reruns and sessions so their
+# HTTP connection pools are reused instead of paying connection setup on every request
+@st.cache_resource(show_spinner=False)
+def get_claude_client(api_key, base_url=None):
+    return anthropic.Anthropic(api_key=api_key, base_url=base_url)
+
+@st.cache_resource(show_spinner=False)
+def get_async_claude_client(api_key, base_url=None):
+    return anthropic.AsyncAnthropic(api_key=api_key, base_url=base_url)
+
+# Background event loop that runs every async Claude request, so async clients
+# always stay on the loop they were first used on
+@st.cache_resource(show_spinner=False)
+def get_claude_event_loop():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="claude-event-loop", daemon=True).start()
+    return loop
+
 # Function to initialize Claude API client
-def initialize_claude_client():
+def initialize_claude_client(async_client=False):
     api_key = st.session_state.get("CLAUDE_API_KEY", "")
     if not api_key:
         return None
     try:
-        client = anthropic.Anthropic(api_key=api_key)
-        return client
+        if async_client:
+            return get_async_claude_client(api_key, CLAUDE_BASE_URL)
+        return get_claude_client(api_key, CLAUDE_BASE_URL)
     except Exception as e:
         st.error(f"Error initializing Claude client: {e}")
         return None
 
+# Rate limits shared by every session using the API key, per minute
+CLAUDE_REQUESTS_PER_MINUTE = int(os.environ.get("CLAUDE_REQUESTS_PER_MINUTE", 50))
+CLAUDE_INPUT_TOKENS_PER_MINUTE = int(os.environ.get("CLAUDE_INPUT_TOKENS_PER_MINUTE", 50000))
+CLAUDE_OUTPUT_TOKENS_PER_MINUTE = int(os.environ.get("CLAUDE_OUTPUT_TOKENS_PER_MINUTE", 10000))
+
+class TokenBucket:
+    """Token bucket that refills continuously up to a per-minute limit"""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Return the seconds until the bucket holds the amount, which is capped at its capacity"""
+        self.refill(now)
+        return max(0.0, (min(amount, self.capacity) - self.tokens) / self.rate)
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+    def give(self, amount):
+        # A negative amount charges for usage above what was reserved
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+class ClaudeRateLimiter:
+    """Process-wide limiter that queues Claude requests until requests, input and output tokens are all available"""
+
+    def __init__(self, requests_per_minute, input_tokens_per_minute, output_tokens_per_minute):
+        self.buckets = {
+            "requests": TokenBucket(requests_per_minute),
+            "input": TokenBucket(input_tokens_per_minute),
+            "output": TokenBucket(output_tokens_per_minute)
+        }
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.admitted = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.last_wait = 0.0
+
+    @staticmethod
+    def estimate_input_tokens(request):
+        """Estimate a request's input tokens at about four characters per token"""
+        parts = [request.get("system", ""), request["messages"], request.get("tools", [])]
+        return len(json.dumps(parts)) // 4
+
+    def acquire(self, request):
+        """Block until the request fits within the limits, and return its (input, output) token reservation"""
+        reservation = {"requests": 1, "input": self.estimate_input_tokens(request), "output": request["max_tokens"]}
+        start = time.monotonic()
+        with self.lock:
+            self.queued += 1
+        try:
+            while True:
+                with self.lock:
+                    now = time.monotonic()
+                    delay = max(self.buckets[name].wait_time(amount, now) for name, amount in reservation.items())
+                    if delay == 0:
+                        for name, amount in reservation.items():
+                            self.buckets[name].take(amount)
+                        break
+                # Sleep in short steps so queued requests re-check as capacity frees up
+                time.sleep(min(delay, 1.0))
+        finally:
+            waited = time.monotonic() - start
+            with self.lock:
+                self.queued -= 1
+                self.admitted += 1
+                self.last_wait = waited
+                if waited > 0.01:
+                    self.waited += 1
+                    self.wait_seconds += waited
+        return reservation["input"], reservation["output"]
+
+    @staticmethod
+    def used_input_tokens(usage):
+        """Return the input tokens a response counts against the limit, including prompt cache writes and reads"""
+        return usage.input_tokens + (getattr(usage, "cache_creation_input_tokens", None) or 0) + (getattr(usage, "cache_read_input_tokens", None) or 0)
+
+    def settle(self, reservation, usage=None):
+        """Correct a reservation with the tokens a response actually used, or refund it if the request failed"""
+        input_tokens, output_tokens = reservation
+        with self.lock:
+            self.buckets["input"].give(input_tokens - (self.used_input_tokens(usage) if usage else 0))
+            self.buckets["output"].give(output_tokens - (usage.output_tokens if usage else 0))
+
+    def stats(self):
+        """Return queue depth and wait time counters"""
+        with self.lock:
+            return {
+                "queued": self.queued,
+                "admitted": self.admitted,
+                "waited": self.waited,
+                "lastWait": self.last_wait,
+                "averageWait": self.wait_seconds / self.waited if self.waited else 0.0
+            }
+
+@st.cache_resource(show_spinner=False)
+def get_claude_rate_limiter():
+    return ClaudeRateLimiter(CLAUDE_REQUESTS_PER_MINUTE, CLAUDE_INPUT_TOKENS_PER_MINUTE, CLAUDE_OUTPUT_TOKENS_PER_MINUTE)
+
+# Retries per Claude call, the longest backoff between them, and the deadline for a call including its retries
+CLAUDE_MAX_RETRIES = 3
+CLAUDE_MAX_BACKOFF = 8.0
+CLAUDE_CALL_DEADLINE = 60.0
+
+# Consecutive failed calls that open the circuit breaker, and how long it stays open
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECONDS = 30.0
+
+# How long a probe call may go without reporting back before another probe is let through
+CIRCUIT_PROBE_TIMEOUT = 2 * CLAUDE_CALL_DEADLINE
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Claude while the circuit breaker is open"""
+
+class CircuitBreaker:
+    """Stops calls to Claude after repeated failures, then lets a single probe call through after a cool-down"""
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS, probe_timeout=CIRCUIT_PROBE_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.probe_timeout = probe_timeout
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started_at = 0.0
+
+    def allow(self):
+        """Return whether a call may go ahead, moving an open breaker to half-open once it has cooled down"""
+        with self.lock:
+            now = time.monotonic()
+            if self.state == "half-open" and now - self.probe_started_at >= self.probe_timeout:
+                # The probe never reported back, so it no longer holds the breaker half-open
+                self.state = "open"
+            if self.state == "open" and now - self.opened_at >= self.reset_seconds:
+                # Admit one probe call; its outcome closes or reopens the breaker
+                self.state = "half-open"
+                self.probe_started_at = now
+                return True
+            return self.state == "closed"
+
+    def check(self):
+        """Raise CircuitOpenError unless a call may go ahead"""
+        if not self.allow():
+            raise CircuitOpenError(f"Claude API unavailable after repeated failures, retrying in {self.retry_in():.0f}s")
+
+    def record_success(self):
+        with self.lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == "half-open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def abandon(self):
+        """Release a probe call that ended without an outcome so the next call can probe instead"""
+        with self.lock:
+            if self.state == "half-open":
+                self.state = "open"
+
+    def retry_in(self):
+        """Return the seconds until an open breaker admits a probe call"""
+        with self.lock:
+            if self.state != "open":
+                return 0.0
+            return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+    def stats(self):
+        return {"state": self.state, "failures": self.failures, "retryIn": self.retry_in()}
+
+@st.cache_resource(show_spinner=False)
+def get_claude_circuit_breaker():
+    return CircuitBreaker()
+
+def is_transient_claude_error(error):
+    """Return whether a failed Claude call is worth retrying: connection problems, timeouts, rate limits and server errors"""
+    if isinstance(error, anthropic.APIConnectionError):
+        return True
+    return isinstance(error, anthropic.APIStatusError) and (error.status_code in (408, 409, 429) or error.status_code >= 500)
+
+def claude_retry_delay(error, attempt):
+    """Return the backoff before a retry: exponential with full jitter, or longer if the API asked for it"""
+    delay = random.uniform(0, min(CLAUDE_MAX_BACKOFF, 0.5 * 2 ** attempt))
+    if isinstance(error, anthropic.APIStatusError):
+        try:
+            delay = max(delay, float(error.response.headers.get("retry-after", 0)))
+        except ValueError:
+            pass
+    return delay
+
+def is_claude_outage(error):
+    """Return whether a transient error points at the API being down rather than a rate limit asking callers to slow down"""
+    return not (isinstance(error, anthropic.APIStatusError) and error.status_code == 429)
+
+def record_claude_outcome(breaker, error=None):
+    """Count a finished call against the breaker: an outage is a failure, a rate limit neither, any other answer a success"""
+    if error is None or not is_transient_claude_error(error):
+        breaker.record_success()
+    elif is_claude_outage(error):
+        breaker.record_failure()
+    else:
+        # A rate limit says nothing about the API's health, but must not leave a probe call holding the breaker
+        breaker.abandon()
+
+def claude_attempt_failed(error, attempt, deadline):
+    """Return the delay before retrying a failed attempt, or None if the error should be raised"""
+    if not is_transient_claude_error(error):
+        return None
+    delay = claude_retry_delay(error, attempt)
+    if attempt == CLAUDE_MAX_RETRIES or time.monotonic() + delay >= deadline:
+        return None
+    return delay
+
+def send_claude_request(client, request, limiter=None, deadline=CLAUDE_CALL_DEADLINE):
+    """Send a Messages API request through the rate limiter and circuit breaker, retrying transient errors"""
+    limiter = limiter or get_claude_rate_limiter()
+    breaker = get_claude_circuit_breaker()
+    deadline = time.monotonic() + deadline
+    # The breaker admits the call once; its retries then run to completion and count as one outcome
+    breaker.check()
+    for attempt in range(CLAUDE_MAX_RETRIES + 1):
+        reservation = limiter.acquire(request)
+        try:
+            # Retries happen here, so the client itself must not retry; each attempt gets the time left
+            response = client.with_options(
+                max_retries=0, timeout=max(1.0, deadline - time.monotonic())
+            ).messages.create(**request)
+        except Exception as e:
+            limiter.settle(reservation)
+            delay = claude_attempt_failed(e, attempt, deadline)
+            if delay is None:
+                record_claude_outcome(breaker, e)
+                raise
+            time.sleep(delay)
+            continue
+        limiter.settle(reservation, response.usage)
+        record_claude_outcome(breaker)
+        return response
+
+async def send_claude_request_async(client, request, limiter, breaker, deadline=CLAUDE_CALL_DEADLINE):
+    """Async send_claude_request for clients on the shared event loop"""
+    deadline = time.monotonic() + deadline
+    breaker.check()
+    for attempt in range(CLAUDE_MAX_RETRIES + 1):
+        # Waiting for the rate limiter blocks, so it happens off the event loop
+        reservation = await asyncio.to_thread(limiter.acquire, request)
+        try:
+            response = await client.with_options(
+                max_retries=0, timeout=max(1.0, deadline - time.monotonic())
+            ).messages.create(**request)
+        except Exception as e:
+            limiter.settle(reservation)
+            delay = claude_attempt_failed(e, attempt, deadline)
+            if delay is None:
+                record_claude_outcome(breaker, e)
+                raise
+            await asyncio.sleep(delay)
+            continue
+        limiter.settle(reservation, response.usage)
+        record_claude_outcome(breaker)
+        return response
+
+# Claude response cache file, how long cached responses stay valid, and its size limit
+RESPONSE_CACHE_FILE = os.path.join(DATA_DIR, "response_cache.sqlite3")
+RESPONSE_CACHE_TTL = timedelta(days=7)
+RESPONSE_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+class ResponseCache:
+    """On-disk cache from Messages API requests to their responses, with TTL and LRU size eviction"""
+
+    def __init__(self, path, ttl=RESPONSE_CACHE_TTL, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.ttl = ttl.total_seconds()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # One connection shared by every session thread, serialized by the lock
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.db.commit()
+
+    @staticmethod
+    def key(request):
+        """Return the content address of a request: model, system prompt, messages and max_tokens"""
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, request):
+        """Return the cached response for a request, or None on a miss"""
+        key = self.key(request)
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            self.hits += 1
+        return anthropic.types.Message.model_validate_json(row[0])
+
+    def put(self, request, response):
+        """Store a response, then drop expired entries and the least recently used ones over the size limit"""
+        data = response.model_dump_json()
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (self.key(request), data, len(data), now, now)
+            )
+            self.db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+            total = 0
+            evicted = []
+            for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY last_used DESC"):
+                total += size
+                if total > self.max_bytes:
+                    evicted.append((key,))
+            self.db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+            self.db.commit()
+
+    def discard(self, request):
+        """Remove a request's cached response, e.g. one that turned out to be unusable"""
+        with self.lock:
+            self.db.execute("DELETE FROM responses WHERE key = ?", (self.key(request),))
+            self.db.commit()
+
+    def stats(self):
+        """Return hit/miss counters and the current cache size"""
+        with self.lock:
+            entries, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": entries,
+            "bytes": size,
+            "hitRate": self.hits / lookups if lookups else 0.0
+        }
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache():
+    return ResponseCache(RESPONSE_CACHE_FILE)
+
+def create_cached_claude_message(client, request):
+    """Send a Messages API request, answering identical repeat requests from the response cache"""
+    cache = get_response_cache()
+    response = cache.get(request)
+    if response is None:
+        response = send_claude_request(client, request)
+        cache.put(request, response)
+    return response
+
 # Initialize session state
 if "initialized" not in st.session_state:
     st.session_state.initialized = True
@@ -46,8 +458,16 @@ if "initialized" not in st.session_state:
     st.session_state.custom_topic = ""
     st.session_state.recommendations = []
     st.session_state.current_page = 0  # For recommendation pagination
-    st.session_state.results_per_page = 5  # Number of recommendations per page
+    st.session_state.results_per_page = 10  # Number of recommendations per page
     st.session_state.CLAUDE_API_KEY = os.environ.get("CLAUDE_API_KEY", "")
+    # Owner of this browser's message batches, kept in the URL so a reload or bookmark finds them again
+    owner_id = st.query_params.get("owner", "")
+    if not re.fullmatch(r"[0-9a-f]{32}", owner_id):
+        owner_id = uuid.uuid4().hex
+        st.query_params["owner"] = owner_id
+    st.session_state.batch_owner_id = owner_id
+    # Seed for reproducible rankings, or None for random jitter
+    st.session_state.scoring_seed = int(os.environ["OUTREACH_SCORING_SEED"]) if os.environ.get("OUTREACH_SCORING_SEED") else None
     st.session_state.profile_uploaded = False
     st.session_state.connections_uploaded = False
     st.session_state.user_profile = {
@@ -329,70 +749,117 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Helper Functions for CSV processing
+
+# Bytes read from the start of an upload to detect its CSV format
+CSV_SNIFF_BYTES = 16 * 1024
+
+def decodes_cleanly(file, encoding, block_size=1024 * 1024):
+    """Return whether a whole upload decodes in the encoding, reading it a block at a time"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    file.seek(0)
+    try:
+        while True:
+            block = file.read(block_size)
+            decoder.decode(block, final=not block)
+            if not block:
+                return True
+    except UnicodeDecodeError:
+        return False
+    finally:
+        file.seek(0)
+
+def sniff_csv_format(file, header_markers=("First Name", "Last Name"), sample_size=CSV_SNIFF_BYTES):
+    """Detect encoding, delimiter, quoting and preamble from the start of a CSV upload"""
+    file.seek(0)
+    sample = file.read(sample_size)
+    file.seek(0)
+    
+    # Byte order marks decide the encoding outright
+    if sample.startswith(codecs.BOM_UTF8):
+        encoding = "utf-8-sig"
+    elif sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        encoding = "utf-16"
+    else:
+        encoding = "utf-8"
+    
+    try:
+        # The incremental decoder tolerates a character cut off at the end of the sample
+        text = codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+    except UnicodeDecodeError:
+        text = None
+    
+    # Bytes past the sample can still be invalid, so a larger file is checked whole before it is parsed strictly
+    if text is None or (len(sample) == sample_size and not decodes_cleanly(file, encoding)):
+        encoding = "latin-1"
+        text = sample.decode(encoding)
+    
+    lines = text.splitlines()
+    if len(sample) == sample_size:
+        # The last line of a partial sample may be truncated
+        lines = lines[:-1]
+    
+    # LinkedIn exports can start with a "Notes:" preamble before the real header row
+    header_idx = next(
+        (i for i, line in enumerate(lines) if all(marker in line for marker in header_markers)),
+        0
+    )
+    
+    csv_format = {
+        "encoding": encoding,
+        "skiprows": header_idx,
+        "sep": ",",
+        "quotechar": '"',
+        "skipinitialspace": True,  # Skip spaces after delimiter
+        "on_bad_lines": "warn",    # Don't fail on problematic lines
+        "dtype": str,              # Keep every field as text, no type inference
+        "keep_default_na": False   # Empty fields become empty strings
+    }
+    
+    data_sample = "\n".join(lines[header_idx:header_idx + 50])
+    if data_sample:
+        try:
+            dialect = csv.Sniffer().sniff(data_sample, delimiters=",;\t|")
+            csv_format["sep"] = dialect.delimiter
+            csv_format["quotechar"] = dialect.quotechar
+        except csv.Error:
+            pass
+    
+    if "\\" + csv_format["quotechar"] in data_sample:
+        csv_format["escapechar"] = "\\"
+    
+    return csv_format
+
 def process_profile_csv(file):
     """Process LinkedIn Profile.csv file with robust error handling"""
     try:
-        # Try multiple parsing approaches
+        # Detect the format from the first few KB and parse the file once
+        csv_format = sniff_csv_format(file)
         try:
-            # First attempt: Standard parsing
-            df = pd.read_csv(
-                file,
-                encoding='utf-8',
-                on_bad_lines='warn',
-                quotechar='"',
-                escapechar='\\',
-                low_memory=False,
-                skipinitialspace=True
-            )
-        except Exception as e1:
-            # Second attempt: Try with python engine
-            try:
-                file.seek(0)
-                df = pd.read_csv(
-                    file,
-                    encoding='utf-8',
-                    delimiter=',',
-                    engine='python',
-                    on_bad_lines='skip',
-                    quoting=3,  # QUOTE_NONE
-                    skipinitialspace=True
-                )
-            except Exception as e2:
-                # Third attempt: Try different encoding
-                try:
-                    file.seek(0)
-                    df = pd.read_csv(
-                        file,
-                        encoding='latin-1',
-                        delimiter=',',
-                        engine='python',
-                        on_bad_lines='skip'
-                    )
-                except Exception as e3:
-                    # Last attempt: Manual parsing
-                    file.seek(0)
-                    content = file.read().decode('utf-8', errors='replace')
-                    
-                    # Try to find key profile fields manually
-                    first_name = extract_field(content, "First Name")
-                    last_name = extract_field(content, "Last Name")
-                    headline = extract_field(content, "Headline")
-                    industry = extract_field(content, "Industry")
-                    location = extract_field(content, "Geo Location")
-                    summary = extract_field(content, "Summary")
-                    
-                    if first_name or last_name:
-                        return {
-                            "firstName": first_name,
-                            "lastName": last_name,
-                            "name": f"{first_name} {last_name}".strip(),
-                            "headline": headline,
-                            "summary": summary,
-                            "industry": industry,
-                            "location": location
-                        }
-                    else:
-                        raise Exception("Could not extract profile data from the file")
+            df = pd.read_csv(file, **csv_format)
+        except Exception:
+            # Last resort: find key profile fields in the raw content
+            file.seek(0)
+            content = file.read().decode(csv_format["encoding"], errors='replace')
+            
+            first_name = extract_field(content, "First Name")
+            last_name = extract_field(content, "Last Name")
+            headline = extract_field(content, "Headline")
+            industry = extract_field(content, "Industry")
+            location = extract_field(content, "Geo Location")
+            summary = extract_field(content, "Summary")
+            
+            if first_name or last_name:
+                return {
+                    "firstName": first_name,
+                    "lastName": last_name,
+                    "name": f"{first_name} {last_name}".strip(),
+                    "headline": headline,
+                    "summary": summary,
+                    "industry": industry,
+                    "location": location
+                }
+            else:
+                raise Exception("Could not extract profile data from the file")
         
         # Show a preview of the processed data
         with st.expander("Preview of imported profile data"):
@@ -465,181 +932,98 @@ def extract_field(content, field_name):
         return match.group(1).strip().strip('"')
     return ""
 
-def process_connections_csv(file):
+# Number of CSV rows parsed and classified at a time when importing connections
+CONNECTIONS_CHUNK_SIZE = 5000
+
+def read_connections_chunks(file, chunk_size=CONNECTIONS_CHUNK_SIZE):
+    """Return a reader yielding Connections.csv as DataFrame chunks of at most chunk_size rows"""
+    # Detect the format from the first few KB and parse the file once
+    csv_format = sniff_csv_format(file, header_markers=("First Name", "Last Name"))
+    return pd.read_csv(file, chunksize=chunk_size, **csv_format)
+
+def normalize_connection_header(columns):
+    """Normalize connection column names and repair the required name columns"""
+    # Normalize column names by stripping whitespace and converting to title case
+    header = [str(col).strip().title() for col in columns]
+    
+    for missing in ["First Name", "Last Name"]:
+        if missing not in header:
+            # Check if a column contains the required name (e.g. "First Name" in "First Name ")
+            header = [missing if missing.lower() in col.lower() else col for col in header]
+    
+    return header
+
+def upload_size(file):
+    """Return the size of an uploaded file in bytes"""
+    size = getattr(file, "size", None)
+    if size is None:
+        position = file.tell()
+        size = file.seek(0, io.SEEK_END)
+        file.seek(position)
+    return size
+
+def process_connections_csv(file, chunk_size=CONNECTIONS_CHUNK_SIZE):
     """Process LinkedIn Connections.csv file with robust error handling"""
     try:
-        # Try multiple parsing approaches to handle LinkedIn's inconsistent CSV format
-        try:
-            # First attempt: Use pandas with more flexible parsing options
-            df = pd.read_csv(
-                file,
-                encoding='utf-8',
-                on_bad_lines='warn',  # Don't fail on problematic lines
-                quotechar='"',        # Handle quoted fields properly
-                escapechar='\\',      # Handle escape sequences
-                low_memory=False,     # Avoid mixed type inference issues
-                skipinitialspace=True # Skip spaces after delimiter
-            )
-        except Exception as e1:
-            # Second attempt: Try with explicit delimiter and engine
-            try:
-                # Reset file position
-                file.seek(0)
-                df = pd.read_csv(
-                    file,
-                    encoding='utf-8',
-                    delimiter=',',
-                    engine='python',  # More flexible but slower engine
-                    on_bad_lines='skip',
-                    quoting=3,  # QUOTE_NONE
-                    skipinitialspace=True
-                )
-            except Exception as e2:
-                # Third attempt: Try reading with different encoding
-                try:
-                    file.seek(0)
-                    df = pd.read_csv(
-                        file,
-                        encoding='latin-1',  # Try alternate encoding
-                        delimiter=',', 
-                        engine='python',
-                        on_bad_lines='skip'
-                    )
-                except Exception as e3:
-                    # Last attempt: Try to manually read and parse the file
-                    file.seek(0)
-                    content = file.read().decode('utf-8', errors='replace')
-                    
-                    # Save content to StringIO for pandas to read
-                    string_data = io.StringIO(content)
-                    
-                    # Try to find the header row and parse from there
-                    lines = content.split('\n')
-                    header_idx = -1
-                    
-                    # Look for a row that likely contains the header
-                    for i, line in enumerate(lines):
-                        if 'First Name' in line and 'Last Name' in line and 'Email' in line:
-                            header_idx = i
-                            break
-                    
-                    if header_idx >= 0:
-                        # Create a new StringIO with just the header and data
-                        clean_content = '\n'.join(lines[header_idx:])
-                        clean_data = io.StringIO(clean_content)
-                        df = pd.read_csv(clean_data, on_bad_lines='skip')
-                    else:
-                        raise Exception("Could not identify header row in the CSV file")
-        
-        # Check if we have the minimum required columns
-        required_columns = ["First Name", "Last Name"]
-        
-        # Normalize column names by stripping whitespace and converting to title case
-        df.columns = [col.strip().title() for col in df.columns]
-        
-        # Check for required columns with normalized names
-        normalized_required = [col.strip().title() for col in required_columns]
-        missing_columns = [col for col in normalized_required if col not in df.columns]
-        
-        if missing_columns:
-            # Try to find columns with similar names
-            for missing in missing_columns:
-                for col in df.columns:
-                    # Check if the column name contains the required name (e.g. "First Name" in "First Name ")
-                    if missing.lower() in col.lower():
-                        # Rename the column to the standard name
-                        df = df.rename(columns={col: missing})
-        
-        # Recheck after attempted fixes
-        missing_columns = [col for col in normalized_required if col not in df.columns]
-        if missing_columns:
-            st.error(f"CSV file is missing required columns: {', '.join(missing_columns)}")
-            st.write("Available columns:", ", ".join(df.columns))
-            return []
-
-        # Show a preview of the data
-        with st.expander("Preview of imported connections data"):
-            st.write("First 5 rows of your connections data:")
-            st.dataframe(df.head())
-            st.write(f"Total connections found: {len(df)}")
-        
-        # Map common column variations to standard names
-        column_mapping = {
-            'First': 'First Name',
-            'Last': 'Last Name',
-            'E-Mail Address': 'Email Address',
-            'Email': 'Email Address',
-            'Position Title': 'Position',
-            'Company Name': 'Company',
-            'Connection Date': 'Connected On'
-        }
-        
-        # Apply column mapping where needed
-        for old_col, new_col in column_mapping.items():
-            if old_col in df.columns and new_col not in df.columns:
-                df = df.rename(columns={old_col: new_col})
-        
-        # Process the connections
-        connections = []
-        
-        for idx, row in df.iterrows():
-            # Define expected columns and their fallbacks with safe accessor
-            first_name = row.get('First Name', '') if hasattr(row, 'get') else str(row.get('First Name', '')) if 'First Name' in row.index else ''
-            last_name = str(row.get('Last Name', '')) if hasattr(row, 'get') else str(row.get('Last Name', '')) if 'Last Name' in row.index else ''
-            
-            # Handle various email column names
-            email = ''
-            for email_col in ['Email Address', 'Email', 'E-Mail Address']:
-                if email_col in row.index:
-                    email = str(row.get(email_col, ''))
-                    break
-            
-            # Handle various company column names
-            company = ''
-            for company_col in ['Company', 'Company Name', 'Organization']:
-                if company_col in row.index:
-                    company = str(row.get(company_col, ''))
-                    break
-            
-            # Handle various position column names
-            position = ''
-            for position_col in ['Position', 'Position Title', 'Title', 'Headline']:
-                if position_col in row.index:
-                    position = str(row.get(position_col, ''))
-                    break
+        total_bytes = max(upload_size(file), 1)
+        progress = st.progress(0.0, text="Importing connections...")
+        
+        connections = ConnectionStore()
+        header = None
+        columns = None
+        rows_read = 0
+        
+        # Parse, classify and append the file one chunk at a time so memory stays
+        # bounded by the chunk size rather than the file size
+        for chunk in read_connections_chunks(file, chunk_size):
+            if header is None:
+                header = normalize_connection_header(chunk.columns)
+                
+                # Check if we have the minimum required columns
+                missing_columns = [col for col in ["First Name", "Last Name"] if col not in header]
+                if missing_columns:
+                    progress.empty()
+                    st.error(f"CSV file is missing required columns: {', '.join(missing_columns)}")
+                    st.write("Available columns:", ", ".join(header))
+                    return []
+                
+                # Show a preview of the data
+                chunk.columns = header
+                preview = st.expander("Preview of imported connections data")
+                preview.write("First 5 rows of your connections data:")
+                preview.dataframe(chunk.head())
+                
+                # Map common column variations to standard names
+                column_mapping = {
+                    'First': 'First Name',
+                    'Last': 'Last Name',
+                    'E-Mail Address': 'Email Address',
+                    'Email': 'Email Address',
+                    'Position Title': 'Position',
+                    'Company Name': 'Company',
+                    'Connection Date': 'Connected On'
+                }
+                
+                # Apply column mapping where needed
+                for old_col, new_col in column_mapping.items():
+                    if old_col in header and new_col not in header:
+                        header = [new_col if col == old_col else col for col in header]
+                
+                # Resolve the column aliases once for the whole file
+                columns = resolve_connection_columns(header)
             
-            # Handle various connection date column names
-            connected_on = ''
-            for date_col in ['Connected On', 'Connection Date', 'Connected']:
-                if date_col in row.index:
-                    connected_on = str(row.get(date_col, ''))
-                    break
+            chunk.columns = header
+            rows_read += len(chunk)
+            connections.extend(build_connection_records(chunk, columns))
             
-            # Skip rows with empty first and last name (likely header or malformed rows)
-            if not first_name.strip() and not last_name.strip():
-                continue
-                
-            # Create connection object with additional fields for our app
-            connection = {
-                "id": str(idx),
-                "firstName": first_name,
-                "lastName": last_name,
-                "fullName": f"{first_name} {last_name}".strip(),
-                "email": email,
-                "company": company,
-                "role": position,
-                # Generate some additional fields with reasonable defaults
-                "industry": extract_industry(company, position),
-                "expertise": extract_expertise(position),
-                "seniority": extract_seniority(position),
-                "companySize": "Unknown",
-                "activityLevel": random.choice(["Low", "Medium", "High"]),
-                "recentProjects": "",
-                "keyAchievements": "",
-                "connectedDate": connected_on,
-                "mutualConnections": random.randint(0, 5),
-            }
-            connections.append(connection)
+            progress.progress(
+                min(file.tell() / total_bytes, 1.0),
+                text=f"Imported {len(connections)} connections..."
+            )
+        
+        progress.empty()
+        if header is not None:
+            preview.write(f"Total connections found: {rows_read}")
         
         return connections
     except Exception as e:
@@ -660,227 +1044,910 @@ def process_connections_csv(file):
         
         return []
 
+# Column aliases for connection fields, in order of preference
+CONNECTION_COLUMN_ALIASES = {
+    "email": ["Email Address", "Email", "E-Mail Address"],
+    "company": ["Company", "Company Name", "Organization"],
+    "role": ["Position", "Position Title", "Title", "Headline"],
+    "connectedDate": ["Connected On", "Connection Date", "Connected"],
+}
+
+# Keyword rules used to classify connections. Each rule is (label, keyword groups):
+# the rule matches when every group has at least one keyword in the text, and the
+# first matching rule wins. New categories only need a new rule here.
+ENGINEERING_KEYWORDS = ["engineer", "developer", "architect", "programmer"]
+
+INDUSTRY_RULES = [
+    ("Technology", [["tech", "software", "digital", "app", "data", "it ", "computer", "cyber", "web", "cloud"]]),
+    ("Finance", [["bank", "finance", "capital", "financial", "invest", "asset", "wealth", "insurance"]]),
+    ("Healthcare", [["health", "medical", "hospital", "pharma", "biotech", "care", "clinic"]]),
+    ("Education", [["university", "college", "school", "education", "academic", "learning", "teaching"]]),
+    ("Marketing", [["marketing", "advertis", "media", "digital", "brand", "content", "creative"]]),
+    ("Retail", [["retail", "shop", "store", "ecommerce", "commerce", "consumer"]]),
+]
+
+EXPERTISE_RULES = [
+    ("Software Development, Engineering", [ENGINEERING_KEYWORDS, ["software", "web"]]),
+    ("Data Engineering, Analytics", [ENGINEERING_KEYWORDS, ["data"]]),
+    ("Cloud Infrastructure, DevOps", [ENGINEERING_KEYWORDS, ["cloud"]]),
+    ("Engineering, Technical Development", [ENGINEERING_KEYWORDS]),
+    ("Data Analysis, Business Intelligence", [["data", "analytics", "analyst", "scientist"]]),
+    ("UX/UI Design, Product Design", [["design", "ux", "ui", "user experience"]]),
+    ("Product Management, Strategy", [["product manager", "product owner"]]),
+    ("Marketing, Branding, Growth", [["market", "brand", "content", "seo", "growth"]]),
+    ("Sales, Business Development", [["sales", "account", "business development"]]),
+    ("Management, Leadership", [["manager", "director", "head of", "lead"]]),
+]
+
+SENIORITY_RULES = [
+    ("C-Suite", [["ceo", "cto", "cfo", "coo", "chief", "president", "founder"]]),
+    ("VP", [["vp", "vice president"]]),
+    ("Director", [["director", "head of"]]),
+    ("Manager", [["manager", "lead", "principal"]]),
+    ("Senior", [["senior", "sr.", "staff"]]),
+    ("Entry Level", [["junior", "jr.", "associate"]]),
+    ("Intern", [["intern", "trainee"]]),
+]
+
+def resolve_connection_columns(columns):
+    """Map each connection field to the CSV column that provides it"""
+    resolved = {"firstName": "First Name", "lastName": "Last Name"}
+    for field, aliases in CONNECTION_COLUMN_ALIASES.items():
+        resolved[field] = next((col for col in aliases if col in columns), None)
+    return resolved
+
+def text_column(df, column):
+    """Return a column as clean strings, or empty strings if the column is absent"""
+    if column is None:
+        return pd.Series("", index=df.index, dtype=object)
+    return df[column].fillna("").astype(str)
+
+def stable_hashes(seed, salt, *columns):
+    """Return a stable 64-bit hash per row of the columns, for seeded stand-ins of random values"""
+    key = f"{seed}:{salt}".encode("utf-8")[:64]
+    return np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b("\x1f".join(row).encode("utf-8"), digest_size=8, key=key).digest(), "little")
+            for row in zip(*columns)
+        ),
+        dtype=np.uint64,
+        count=len(columns[0])
+    )
+
+def build_connection_records(df, columns):
+    """Build the connection fields for a whole DataFrame in one batch, as a dict of columns"""
+    first_names = text_column(df, columns["firstName"])
+    last_names = text_column(df, columns["lastName"])
+    
+    # Skip rows with empty first and last name (likely header or malformed rows)
+    keep = (first_names.str.strip() != "") | (last_names.str.strip() != "")
+    df = df[keep]
+    first_names = first_names[keep]
+    last_names = last_names[keep]
+    
+    company = text_column(df, columns["company"])
+    position = text_column(df, columns["role"])
+    count = len(df)
+    
+    # Classify each distinct (company, position) pair once and broadcast the results
+    pair_codes, unique_pairs = pd.factorize(pd.MultiIndex.from_arrays([company, position]))
+    classification_cache = get_classification_cache()
+    classified = np.array(
+        [classification_cache.classify(pair_company, pair_position) for pair_company, pair_position in unique_pairs],
+        dtype=object
+    ).reshape(-1, 3)
+    industries, expertise, seniority = (classified[pair_codes, i].tolist() for i in range(3))
+    
+    # Activity and mutual connections are not in the export; in seeded mode they come from a per-contact hash
+    seed = st.session_state.get("scoring_seed")
+    if seed is None:
+        activity = random.choices(["Low", "Medium", "High"], k=count)
+        mutual_connections = [random.randint(0, 5) for _ in range(count)]
+    else:
+        hashes = stable_hashes(seed, "import", first_names.tolist(), last_names.tolist(), company.tolist(), position.tolist())
+        activity = np.array(["Low", "Medium", "High"])[hashes % np.uint64(3)].tolist()
+        mutual_connections = ((hashes >> np.uint64(8)) % np.uint64(6)).tolist()
+    
+    fields = {
+        "id": df.index.astype(str).tolist(),
+        "firstName": first_names.tolist(),
+        "lastName": last_names.tolist(),
+        "fullName": (first_names + " " + last_names).str.strip().tolist(),
+        "email": text_column(df, columns["email"]).tolist(),
+        "company": company.tolist(),
+        "role": position.tolist(),
+        # Generate some additional fields with reasonable defaults
+        "industry": industries,
+        "expertise": expertise,
+        "seniority": seniority,
+        "companySize": ["Unknown"] * count,
+        "activityLevel": activity,
+        "recentProjects": [""] * count,
+        "keyAchievements": [""] * count,
+        "connectedDate": text_column(df, columns["connectedDate"]).tolist(),
+        "mutualConnections": mutual_connections,
+    }
+    
+    return fields
+
+def keyword_trie_pattern(keywords):
+    """Build a regex that matches the longest of the keywords, factored as a prefix trie"""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = "(?:" + "|".join(branches) + ")"
+        # Greedy optional branches make a longer keyword win over its prefix
+        return body + "?" if "" in node else body
+    
+    return build(trie)
+
+def compile_keyword_classifier(fields):
+    """Compile the keyword rules of every classified field into a single matcher"""
+    keywords = sorted({keyword for _, rules, _, _ in fields for _, groups in rules for group in groups for keyword in group})
+    
+    # The lookahead reports the longest keyword starting at every position, so overlapping
+    # keywords are all seen. The leading character class skips positions where no keyword
+    # can start.
+    first_chars = re.escape("".join(sorted({keyword[0] for keyword in keywords})))
+    pattern = re.compile(f"(?=[{first_chars}])(?=({keyword_trie_pattern(keywords)}))")
+    
+    # Every keyword group gets one bit. A match sets the bits of each group containing the
+    # matched keyword or one of its prefixes, which start at the same position.
+    group_bits = {}
+    compiled_fields = []
+    for field, rules, default, position_only in fields:
+        compiled_rules = []
+        for label, groups in rules:
+            required = 0
+            for group in groups:
+                bit = group_bits.setdefault((position_only, tuple(group)), 1 << len(group_bits))
+                required |= bit
+            compiled_rules.append((label, required))
+        compiled_fields.append((compiled_rules, default))
+    
+    text_masks = {keyword: 0 for keyword in keywords}
+    position_masks = {keyword: 0 for keyword in keywords}
+    for (position_only, group), bit in group_bits.items():
+        masks = position_masks if position_only else text_masks
+        for keyword in keywords:
+            if any(keyword.startswith(member) for member in group):
+                masks[keyword] |= bit
+    
+    return {
+        "pattern": pattern,
+        "text_masks": text_masks,
+        "position_masks": position_masks,
+        "fields": compiled_fields,
+        "results": {}
+    }
+
+# Classified fields as (field, rules, default, position_only). Industry looks at the
+# company and position together, the other fields at the position only.
+KEYWORD_CLASSIFIER = compile_keyword_classifier([
+    ("industry", INDUSTRY_RULES, "Other", False),
+    ("expertise", EXPERTISE_RULES, "Professional Services", True),
+    ("seniority", SENIORITY_RULES, "Mid Level", True),
+])
+
+def classify_connection(company, position):
+    """Classify industry, expertise and seniority in one pass over company and position"""
+    company_lower = company.lower()
+    text = company_lower + " " + position.lower()
+    position_start = len(company_lower) + 1
+    text_masks = KEYWORD_CLASSIFIER["text_masks"]
+    position_masks = KEYWORD_CLASSIFIER["position_masks"]
+    
+    found = 0
+    for match in KEYWORD_CLASSIFIER["pattern"].finditer(text):
+        keyword = match.group(1)
+        found |= text_masks[keyword]
+        if match.start() >= position_start:
+            found |= position_masks[keyword]
+    
+    # The labels only depend on which groups matched, so resolve each combination once
+    results = KEYWORD_CLASSIFIER["results"].get(found)
+    if results is None:
+        # Rules are checked in priority order, so the first matching rule wins
+        results = tuple(
+            next((label for label, required in rules if found & required == required), default)
+            for rules, default in KEYWORD_CLASSIFIER["fields"]
+        )
+        KEYWORD_CLASSIFIER["results"][found] = results
+    
+    return results
+
+class ClassificationCache:
+    """Bounded LRU cache from normalized (company, position) strings to classification results"""
+    
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def classify(self, company, position):
+        """Return the (industry, expertise, seniority) classification, computing it on a miss"""
+        # Classification only looks at lowercase text, so that is the normalized key
+        key = (company.lower(), position.lower())
+        result = self.entries.get(key)
+        if result is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return result
+        
+        self.misses += 1
+        result = classify_connection(*key)
+        self.entries[key] = result
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return result
+    
+    def stats(self):
+        """Return hit/miss counters and the current cache size"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.entries),
+            "hitRate": self.hits / lookups if lookups else 0.0
+        }
+
+def get_classification_cache():
+    """Return the session's classification cache, which survives reruns and re-uploads"""
+    if "classification_cache" not in st.session_state:
+        st.session_state.classification_cache = ClassificationCache()
+    return st.session_state.classification_cache
+
 def extract_industry(company, position):
     """Extract likely industry based on company name and position"""
     # This is a very simplified version - in a real app, you would use NLP or a database
-    
-    # Check for common industry keywords in company and position
-    text = (company + " " + position).lower()
-    
-    if any(tech in text for tech in ["tech", "software", "digital", "app", "data", "it ", "computer", "cyber", "web", "cloud"]):
-        return "Technology"
-    elif any(fin in text for fin in ["bank", "finance", "capital", "financial", "invest", "asset", "wealth", "insurance"]):
-        return "Finance"
-    elif any(health in text for health in ["health", "medical", "hospital", "pharma", "biotech", "care", "clinic"]):
-        return "Healthcare"
-    elif any(edu in text for edu in ["university", "college", "school", "education", "academic", "learning", "teaching"]):
-        return "Education"
-    elif any(mkt in text for mkt in ["marketing", "advertis", "media", "digital", "brand", "content", "creative"]):
-        return "Marketing"
-    elif any(retail in text for retail in ["retail", "shop", "store", "ecommerce", "commerce", "consumer"]):
-        return "Retail"
-    else:
-        return "Other"
+    return get_classification_cache().classify(company, position)[0]
 
 def extract_expertise(position):
     """Extract expertise areas based on job position"""
     # This is a simplified version - in a real app, you would use more sophisticated NLP
-    
-    position_lower = position.lower()
-    
-    # Check for engineering/technical roles
-    if any(eng in position_lower for eng in ["engineer", "developer", "architect", "programmer"]):
-        if "software" in position_lower or "web" in position_lower:
-            return "Software Development, Engineering"
-        elif "data" in position_lower:
-            return "Data Engineering, Analytics"
-        elif "cloud" in position_lower:
-            return "Cloud Infrastructure, DevOps"
-        else:
-            return "Engineering, Technical Development"
-    
-    # Check for data/analytics roles
-    elif any(data in position_lower for data in ["data", "analytics", "analyst", "scientist"]):
-        return "Data Analysis, Business Intelligence"
-    
-    # Check for design roles
-    elif any(design in position_lower for design in ["design", "ux", "ui", "user experience"]):
-        return "UX/UI Design, Product Design"
-    
-    # Check for product roles
-    elif any(product in position_lower for product in ["product manager", "product owner"]):
-        return "Product Management, Strategy"
-    
-    # Check for marketing roles
-    elif any(mkt in position_lower for mkt in ["market", "brand", "content", "seo", "growth"]):
-        return "Marketing, Branding, Growth"
-    
-    # Check for sales roles
-    elif any(sales in position_lower for sales in ["sales", "account", "business development"]):
-        return "Sales, Business Development"
-    
-    # Check for management roles
-    elif any(mgmt in position_lower for mgmt in ["manager", "director", "head of", "lead"]):
-        return "Management, Leadership"
-    
-    else:
-        return "Professional Services"
+    return get_classification_cache().classify("", position)[1]
 
 def extract_seniority(position):
     """Extract seniority level based on job position"""
-    position_lower = position.lower()
-    
-    if any(exec_title in position_lower for exec_title in ["ceo", "cto", "cfo", "coo", "chief", "president", "founder"]):
-        return "C-Suite"
-    elif any(vp in position_lower for vp in ["vp", "vice president"]):
-        return "VP"
-    elif any(dir in position_lower for dir in ["director", "head of"]):
-        return "Director"
-    elif any(mgr in position_lower for mgr in ["manager", "lead", "principal"]):
-        return "Manager"
-    elif any(senior in position_lower for senior in ["senior", "sr.", "staff"]):
-        return "Senior"
-    elif any(junior in position_lower for junior in ["junior", "jr.", "associate"]):
-        return "Entry Level"
-    elif any(intern in position_lower for intern in ["intern", "trainee"]):
-        return "Intern"
-    else:
-        return "Mid Level"
+    return get_classification_cache().classify("", position)[2]
+
+# Connection storage
+class ConnectionRow(Mapping):
+    """Read-only dict-like view of one connection in a ConnectionStore"""
+    
+    __slots__ = ("store", "index")
+    
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+    
+    def __getitem__(self, field):
+        return self.store.value(self.index, field)
+    
+    def __iter__(self):
+        return iter(ConnectionStore.FIELDS)
+    
+    def __len__(self):
+        return len(ConnectionStore.FIELDS)
+    
+    def __repr__(self):
+        return f"ConnectionRow({dict(self)!r})"
+
+def token_postings(columns, count, tokenize):
+    """Return the sorted row offsets of each token in factorized (codes, values) columns, tokenizing every distinct value once"""
+    token_ids = {}
+    row_parts = []
+    token_parts = []
+    for codes, values in columns:
+        value_tokens = [[token_ids.setdefault(token, len(token_ids)) for token in set(tokenize(value))] for value in values]
+        token_counts = np.fromiter(map(len, value_tokens), dtype=np.int64, count=len(value_tokens))
+        pair_codes = np.repeat(np.arange(len(values)), token_counts)
+        pair_tokens = np.fromiter(itertools.chain.from_iterable(value_tokens), dtype=np.int64, count=int(token_counts.sum()))
+        
+        # Each (value, token) pair expands to one (row, token) pair per row holding that value
+        rows_by_code = np.argsort(codes, kind="stable")
+        code_counts = np.bincount(codes, minlength=len(values))
+        code_starts = np.cumsum(code_counts) - code_counts
+        pair_sizes = code_counts[pair_codes]
+        pair_offsets = np.arange(pair_sizes.sum()) - np.repeat(np.cumsum(pair_sizes) - pair_sizes, pair_sizes)
+        row_parts.append(rows_by_code[np.repeat(code_starts[pair_codes], pair_sizes) + pair_offsets])
+        token_parts.append(np.repeat(pair_tokens, pair_sizes))
+    
+    if not token_ids or not count:
+        return {}
+    # Sorting by token then row groups each token's rows, and drops a token found in several fields of the same row
+    pairs = np.sort(np.concatenate(token_parts) * count + np.concatenate(row_parts))
+    pairs = pairs[np.diff(pairs, prepend=-1) != 0]
+    token_of_pair, rows = np.divmod(pairs, count)
+    starts = np.flatnonzero(np.diff(token_of_pair, prepend=-1))
+    vocabulary = list(token_ids)
+    return {vocabulary[token]: offsets for token, offsets in zip(token_of_pair[starts].tolist(), np.split(rows, starts[1:]))}
+
+def add_token_postings(postings, start, columns, count, tokenize):
+    """Append connections numbered from start to an inverted index, returning the tokens it did not have yet"""
+    new_tokens = []
+    for token, offsets in token_postings(columns, count, tokenize).items():
+        posting = postings.get(token)
+        if posting is None:
+            posting = postings[token] = array("q")
+            new_tokens.append(token)
+        posting.frombytes((offsets + start).tobytes())
+    return new_tokens
+
+class ContactSearchIndex:
+    """Inverted index from name, company, role, expertise and industry tokens to connections, built on first search"""
+    
+    FIELDS = ("firstName", "lastName", "company", "role", "expertise", "industry")
+    TOKEN_PATTERN = re.compile(r"\w+")
+    
+    def __init__(self, store):
+        self.store = store
+        self.postings = {}
+        self.vocabulary = []
+        self.vocabulary_sorted = True
+        self.size = 0
+    
+    def tokenize(self, text):
+        """Split text into lowercase word tokens"""
+        return self.TOKEN_PATTERN.findall(text.lower())
+    
+    def refresh(self):
+        """Index the connections added to the store since the index was last used"""
+        start, size = self.size, len(self.store)
+        if start == size:
+            return
+        columns = (self.store.factorize(field, start) for field in self.FIELDS)
+        new_tokens = add_token_postings(self.postings, start, columns, size - start, self.tokenize)
+        if new_tokens:
+            self.vocabulary.extend(new_tokens)
+            self.vocabulary_sorted = False
+        self.size = size
+    
+    def tokens_with_prefix(self, prefix):
+        """Return the indexed tokens starting with prefix"""
+        if not self.vocabulary_sorted:
+            self.vocabulary.sort()
+            self.vocabulary_sorted = True
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = bisect.bisect_left(self.vocabulary, prefix + chr(sys.maxunicode))
+        return self.vocabulary[start:end]
+    
+    def search(self, query, scores=None):
+        """Return indices of connections matching every query term by prefix, best match first"""
+        terms = self.tokenize(query)
+        if not terms:
+            return np.empty(0, dtype=np.int64)
+        
+        self.refresh()
+        matched = np.ones(self.size, dtype=bool)
+        relevance = np.zeros(self.size, dtype=np.int64)
+        for term in terms:
+            # Whole-word matches count double compared to prefix matches
+            term_relevance = np.zeros(self.size, dtype=np.int64)
+            for token in self.tokens_with_prefix(term):
+                ids = np.array(self.postings[token], dtype=np.int64)
+                weight = 2 if token == term else 1
+                term_relevance[ids] = np.maximum(term_relevance[ids], weight)
+            matched &= term_relevance > 0
+            relevance += term_relevance
+        
+        ids = np.flatnonzero(matched)
+        tiebreak = scores[ids] if scores is not None else np.zeros(len(ids), dtype=np.int64)
+        return ids[np.lexsort((ids, -tiebreak, -relevance[ids]))]
+
+class CustomGoalIndex:
+    """Inverted index from whitespace tokens of the custom goal fields to connections, built on first use"""
+    
+    FIELDS = ("industry", "expertise", "role", "company")
+    
+    def __init__(self, store):
+        self.store = store
+        self.postings = {}
+        self.term_ids = {}
+        self.term_tokens = {}
+        self.size = 0
+    
+    def tokenize(self, text):
+        """Split text into lowercase whitespace-separated tokens"""
+        return text.lower().split()
+    
+    def refresh(self):
+        """Index the connections added to the store since the index was last used"""
+        start, size = self.size, len(self.store)
+        if start == size:
+            return
+        columns = (self.store.factorize(field, start) for field in self.FIELDS)
+        add_token_postings(self.postings, start, columns, size - start, self.tokenize)
+        self.size = size
+        self.term_ids.clear()
+        self.term_tokens.clear()
+    
+    def tokens_containing(self, term):
+        """Return the indexed tokens that contain a term, scanning the vocabulary once per term"""
+        tokens = self.term_tokens.get(term)
+        if tokens is None:
+            # Terms have no whitespace, so a term is in a field value exactly when it is in one of its tokens
+            tokens = self.term_tokens[term] = frozenset(token for token in self.postings if term in token)
+        return tokens
+    
+    def ids_matching(self, term):
+        """Return the indices of connections with a term in any custom goal field"""
+        ids = self.term_ids.get(term)
+        if ids is None:
+            postings = [np.array(self.postings[token], dtype=np.int64) for token in self.tokens_containing(term)]
+            ids = self.term_ids[term] = np.concatenate(postings) if postings else np.empty(0, dtype=np.int64)
+        return ids
+    
+    def mask(self, terms):
+        """Return a boolean array marking connections with any of the terms in a custom goal field"""
+        self.refresh()
+        mask = np.zeros(self.size, dtype=bool)
+        for term in terms:
+            mask[self.ids_matching(term)] = True
+        return mask
+    
+    def matching_tokens(self, terms):
+        """Return the set of tokens that contain any of the terms"""
+        self.refresh()
+        return frozenset().union(*(self.tokens_containing(term) for term in terms))
+
+class ConnectionStore:
+    """Columnar store of connections with dictionary-encoded categorical fields"""
+    
+    FIELDS = (
+        "id", "firstName", "lastName", "fullName", "email", "company", "role",
+        "industry", "expertise", "seniority", "companySize", "activityLevel",
+        "recentProjects", "keyAchievements", "connectedDate", "mutualConnections"
+    )
+    # Fields with few distinct values, stored as one byte per row plus a table of values
+    CATEGORICAL_FIELDS = ("industry", "expertise", "seniority", "companySize", "activityLevel")
+    # Free-text fields, stored as interned strings so repeated values are kept once
+    TEXT_FIELDS = ("firstName", "lastName", "email", "company", "role", "recentProjects", "keyAchievements", "connectedDate")
+    
+    def __init__(self):
+        self.ids = array("L")
+        self.mutual_connections = array("B")
+        self.text = {field: [] for field in self.TEXT_FIELDS}
+        self.codes = {field: array("B") for field in self.CATEGORICAL_FIELDS}
+        self.categories = {field: [] for field in self.CATEGORICAL_FIELDS}
+        self.category_codes = {field: {} for field in self.CATEGORICAL_FIELDS}
+        self.search_index = ContactSearchIndex(self)
+        self.goal_index = CustomGoalIndex(self)
+        # Hash of the contents, computed on first use and cleared whenever connections are added
+        self.content_hash = None
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("connection index out of range")
+        return ConnectionRow(self, index)
+    
+    def __iter__(self):
+        for index in range(len(self)):
+            yield ConnectionRow(self, index)
+    
+    def encode(self, field, value):
+        """Return the code of a categorical value, adding it to the field's table if new"""
+        codes = self.category_codes[field]
+        code = codes.get(value)
+        if code is None:
+            code = len(codes)
+            if code > 255:
+                raise ValueError(f"Too many distinct values for {field}")
+            codes[value] = code
+            self.categories[field].append(value)
+        return code
+    
+    def code_of(self, field, value):
+        """Return the code of a categorical value, or None if no connection has it"""
+        return self.category_codes[field].get(value)
+    
+    def extend(self, fields):
+        """Append connections given as a dict of equal-length field lists"""
+        self.ids.extend(int(connection_id) for connection_id in fields["id"])
+        self.mutual_connections.extend(fields["mutualConnections"])
+        for field in self.TEXT_FIELDS:
+            self.text[field].extend(sys.intern(value) for value in fields[field])
+        for field in self.CATEGORICAL_FIELDS:
+            self.codes[field].extend(self.encode(field, value) for value in fields[field])
+        self.content_hash = None
+    
+    def value(self, index, field):
+        """Return one field of one connection"""
+        if field in self.text:
+            return self.text[field][index]
+        if field in self.codes:
+            return self.categories[field][self.codes[field][index]]
+        if field == "id":
+            return str(self.ids[index])
+        if field == "fullName":
+            return f"{self.text['firstName'][index]} {self.text['lastName'][index]}".strip()
+        if field == "mutualConnections":
+            return self.mutual_connections[index]
+        raise KeyError(field)
+    
+    def factorize(self, field, start=0):
+        """Return a field's values from start onwards as (codes, distinct values)"""
+        if field in self.codes:
+            return np.frombuffer(self.codes[field], dtype=np.uint8)[start:].astype(np.int64), self.categories[field]
+        return pd.factorize(np.asarray(self.text[field][start:], dtype=object))
+    
+    def code_array(self, field):
+        """Return the codes of a categorical field as a NumPy array"""
+        return np.array(self.codes[field], dtype=np.uint8)
+    
+    def mutual_connections_array(self):
+        """Return the mutual connection counts as a NumPy array"""
+        return np.array(self.mutual_connections, dtype=np.int64)
+    
+    def category_mask(self, field, values):
+        """Return a boolean array marking connections whose field is one of the values"""
+        codes = [code for code in (self.code_of(field, value) for value in values) if code is not None]
+        return np.isin(self.code_array(field), codes)
+    
+    def fingerprint(self):
+        """Return a hash of every connection's fields, computed once, identifying the store's contents"""
+        if self.content_hash is None:
+            # Hash the columns directly rather than row by row
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(self.ids.tobytes())
+            digest.update(self.mutual_connections.tobytes())
+            for field in self.CATEGORICAL_FIELDS:
+                digest.update(self.codes[field].tobytes())
+                digest.update("\x1f".join(self.categories[field]).encode("utf-8"))
+            for field in self.TEXT_FIELDS:
+                digest.update("\x1f".join(self.text[field]).encode("utf-8"))
+            self.content_hash = digest.hexdigest()
+        return self.content_hash
+    
+    def value_counts(self, field):
+        """Count connections per value of a categorical field"""
+        counts = np.bincount(np.array(self.codes[field], dtype=np.uint8), minlength=len(self.categories[field]))
+        return {value: int(count) for value, count in zip(self.categories[field], counts) if count}
 
 # Helper Functions
-def generate_recommendations(count=30):
-    """Generate AI-powered contact recommendations"""
-    if not st.session_state.linkedin_connections:
-        return []
-    
-    scored_contacts = []
+
+# Seniority levels that earn a bonus for each networking goal, and the bonus they earn
+GOAL_SENIORITY_BONUS = {
+    "Career Advancement": (["Senior", "Manager", "Director", "VP"], 15),
+    "Industry Knowledge": (["Senior", "Manager", "Director"], 15),
+    "Business Development": (["Manager", "Director", "VP", "C-Suite"], 15),
+    "Job Seeking": (["Manager", "Director", "VP"], 20),
+}
+
+# Contact fields searched for the terms of a custom networking goal, in order
+CUSTOM_GOAL_FIELDS = list(CustomGoalIndex.FIELDS)
+
+def custom_goal_terms(custom_goal):
+    """Split a custom networking goal into its significant lowercase terms"""
+    return [term.strip() for term in custom_goal.lower().split() if len(term.strip()) > 3]
+
+def custom_goal_mask(store, goal_terms):
+    """Return a boolean array marking connections with a goal term in any goal field"""
+    return store.goal_index.mask(goal_terms)
+
+class ConnectionScorer:
+    """Scores connections as a goal-independent base score plus a bonus for the networking goal"""
     
-    for contact in st.session_state.linkedin_connections:
-        # Generate a score based on industry match, seniority, and networking goal
-        base_score = 50  # Base score
+    def __init__(self, store, user_profile, seed=None):
+        self.store = store
+        self.industry = user_profile.get("industry")
+        self.seed = seed
+        self.goal_bonuses = {}
+        self.custom_goal_bonus_terms = None
+        self.custom_goal_bonus_array = None
+        
+        scores = np.full(len(store), 50, dtype=np.int64)  # Base score
         
         # Industry match bonus
-        if contact.get("industry") == st.session_state.user_profile.get("industry"):
-            base_score += 20
-        
-        # Seniority bonus based on networking goal
-        if st.session_state.networking_goal == "Career Advancement" and contact.get("seniority") in ["Senior", "Manager", "Director", "VP"]:
-            base_score += 15
-        elif st.session_state.networking_goal == "Industry Knowledge" and contact.get("seniority") in ["Senior", "Manager", "Director"]:
-            base_score += 15
-        elif st.session_state.networking_goal == "Business Development" and contact.get("seniority") in ["Manager", "Director", "VP", "C-Suite"]:
-            base_score += 15
-        elif st.session_state.networking_goal == "Job Seeking" and contact.get("seniority") in ["Manager", "Director", "VP"]:
-            base_score += 20
+        scores += 20 * store.category_mask("industry", [self.industry])
         
         # Activity level bonus
-        if contact.get("activityLevel") == "High":
-            base_score += 10
+        scores += 10 * store.category_mask("activityLevel", ["High"])
         
         # Mutual connections bonus
-        base_score += min(contact.get("mutualConnections", 0) * 3, 15)
-        
-        # Custom goal bonus (if specified)
-        custom_goal = st.session_state.get("custom_goal", "").lower()
-        if custom_goal:
-            # Check if custom goal terms are present in contact fields
-            goal_terms = [term.strip() for term in custom_goal.split() if len(term.strip()) > 3]
-            
-            for term in goal_terms:
-                # Check various fields for the term
-                term_found = False
-                for field in ["industry", "expertise", "role", "company"]:
-                    if term in str(contact.get(field, "")).lower():
-                        base_score += 15
-                        term_found = True
-                        break
-                
-                if term_found:
-                    break  # Only apply bonus once per contact
-        
-        # Add some randomness
-        score = min(max(base_score + random.randint(-5, 5), 40), 95)
-        
-        # Generate insights based on networking goal
-        insights = []
+        scores += np.minimum(store.mutual_connections_array() * 3, 15)
         
-        # Common insights for all goals
-        if contact.get("industry") == st.session_state.user_profile.get("industry"):
-            insights.append(f"Same industry ({contact.get('industry')})")
-        
-        if contact.get("mutualConnections", 0) > 0:
-            insights.append(f"{contact.get('mutualConnections')} mutual connections")
-        
-        # Goal-specific insights
-        if st.session_state.networking_goal == "Career Advancement":
-            if contact.get("seniority") in ["Senior", "Manager", "Director", "VP"]:
-                insights.append(f"Senior position ({contact.get('seniority')}) for career guidance")
-            
-            if contact.get("expertise") and st.session_state.user_profile.get("headline") and any(exp in st.session_state.user_profile.get("headline") for exp in contact.get("expertise").split(",")):
-                insights.append(f"Shares your expertise in {contact.get('expertise').split(',')[0]}")
-        
-        elif st.session_state.networking_goal == "Industry Knowledge":
-            if contact.get("expertise"):
-                expertise = contact.get("expertise").split(",")[0].strip() if "," in contact.get("expertise") else contact.get("expertise")
-                insights.append(f"Expert in {expertise}")
-        
-        elif st.session_state.networking_goal == "Business Development":
-            if contact.get("seniority") in ["Manager", "Director", "VP", "C-Suite"]:
-                insights.append(f"Decision maker ({contact.get('seniority')})")
-            
-            if contact.get("companySize") in ["Large", "Enterprise"]:
-                insights.append(f"Works at {contact.get('companySize')} company")
-        
-        elif st.session_state.networking_goal == "Job Seeking":
-            if contact.get("seniority") in ["Manager", "Director", "VP"]:
-                insights.append(f"Hiring authority ({contact.get('seniority')})")
-            
-            if contact.get("company"):
-                insights.append(f"Works at target company ({contact.get('company')})")
-        
-        # Custom goal insights
-        if custom_goal:
-            for field in ["industry", "expertise", "role", "company"]:
-                value = contact.get(field, "")
-                if value and any(term.lower() in value.lower() for term in goal_terms if len(term) > 3):
-                    insights.append(f"Matches your goal: {value}")
-                    break
-        
-        # Fill with more generic insights if needed
-        if len(insights) < 2:
-            potential_insights = [
-                f"Experienced in {contact.get('expertise').split(',')[0] if contact.get('expertise') and ',' in contact.get('expertise') else contact.get('expertise', 'professional skills')}",
-                f"Works at {contact.get('company', 'a company')}",
-                f"{contact.get('seniority', 'Professional')} level position",
-                f"Connected on {contact.get('connectedDate', 'LinkedIn')}"
-            ]
-            insights.extend(random.sample(potential_insights, min(2, len(potential_insights))))
-        
-        # Take only the top 3 insights
-        insights = insights[:3]
-        
-        # Determine match strength
-        if score >= 80:
-            match_strength = "Exceptional Match"
-        elif score >= 65:
-            match_strength = "Strong Match"
-        elif score >= 50:
-            match_strength = "Good Match"
+        # Add some randomness, taken from a stable per-contact hash in seeded mode
+        if seed is None:
+            scores += np.random.default_rng().integers(-5, 6, size=len(store))
         else:
-            match_strength = "Moderate Match"
-        
-        # Create a recommendation object
-        recommendation = {
-            **contact,
-            "score": score,
-            "insights": insights,
-            "matchStrength": match_strength
-        }
-        
-        scored_contacts.append(recommendation)
+            text = store.text
+            hashes = stable_hashes(seed, "jitter", text["firstName"], text["lastName"], text["company"], text["role"])
+            scores += (hashes % np.uint64(11)).astype(np.int64) - 5
+        self.base_scores = scores
+    
+    def matches(self, store, user_profile, seed=None):
+        """Return whether the base scores are still valid for a connection store, profile and seed"""
+        return (
+            store is self.store and len(store) == len(self.base_scores)
+            and user_profile.get("industry") == self.industry and seed == self.seed
+        )
+    
+    def goal_bonus(self, networking_goal):
+        """Return the seniority bonus for a networking goal, computed once per goal"""
+        if networking_goal not in self.goal_bonuses:
+            bonuses = np.zeros(len(self.store), dtype=np.int64)
+            if networking_goal in GOAL_SENIORITY_BONUS:
+                levels, bonus = GOAL_SENIORITY_BONUS[networking_goal]
+                bonuses[self.store.category_mask("seniority", levels)] = bonus
+            self.goal_bonuses[networking_goal] = bonuses
+        return self.goal_bonuses[networking_goal]
+    
+    def custom_goal_bonus(self, goal_terms):
+        """Return the custom goal bonus, applied only once per contact and kept for the latest terms"""
+        if goal_terms != self.custom_goal_bonus_terms:
+            self.custom_goal_bonus_terms = goal_terms
+            self.custom_goal_bonus_array = 15 * custom_goal_mask(self.store, goal_terms)
+        return self.custom_goal_bonus_array
+    
+    def scores(self, networking_goal, custom_goal=""):
+        """Score every connection for a networking goal, reusing the base scores"""
+        scores = self.base_scores + self.goal_bonus(networking_goal)
+        goal_terms = custom_goal_terms(custom_goal)
+        if goal_terms:
+            scores += self.custom_goal_bonus(goal_terms)
+        return np.clip(scores, 40, 95)
+
+def get_connection_scorer():
+    """Return the session's connection scorer, rebuilding it after a new import, profile industry or seed"""
+    store = st.session_state.linkedin_connections
+    user_profile = st.session_state.user_profile
+    seed = st.session_state.get("scoring_seed")
+    scorer = st.session_state.get("connection_scorer")
+    if scorer is None or not scorer.matches(store, user_profile, seed):
+        scorer = ConnectionScorer(store, user_profile, seed)
+        st.session_state.connection_scorer = scorer
+    return scorer
+
+def top_k_indices(scores, count):
+    """Return the indices of the highest scores in rank order, without sorting every score"""
+    if count <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+    if count < len(scores):
+        candidates = np.argpartition(-scores, count - 1)[:count]
+    else:
+        candidates = np.arange(len(scores))
+    # Highest score first, ties in import order
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+def generate_insights(contact, networking_goal, user_profile, goal_tokens, seed=None):
+    """Generate insights on why a contact is worth reaching out to"""
+    insights = []
+    
+    # Common insights for all goals
+    if contact.get("industry") == user_profile.get("industry"):
+        insights.append(f"Same industry ({contact.get('industry')})")
+    
+    if contact.get("mutualConnections", 0) > 0:
+        insights.append(f"{contact.get('mutualConnections')} mutual connections")
+    
+    # Goal-specific insights
+    if networking_goal == "Career Advancement":
+        if contact.get("seniority") in ["Senior", "Manager", "Director", "VP"]:
+            insights.append(f"Senior position ({contact.get('seniority')}) for career guidance")
+        
+        if contact.get("expertise") and user_profile.get("headline") and any(exp in user_profile.get("headline") for exp in contact.get("expertise").split(",")):
+            insights.append(f"Shares your expertise in {contact.get('expertise').split(',')[0]}")
+    
+    elif networking_goal == "Industry Knowledge":
+        if contact.get("expertise"):
+            expertise = contact.get("expertise").split(",")[0].strip() if "," in contact.get("expertise") else contact.get("expertise")
+            insights.append(f"Expert in {expertise}")
+    
+    elif networking_goal == "Business Development":
+        if contact.get("seniority") in ["Manager", "Director", "VP", "C-Suite"]:
+            insights.append(f"Decision maker ({contact.get('seniority')})")
+        
+        if contact.get("companySize") in ["Large", "Enterprise"]:
+            insights.append(f"Works at {contact.get('companySize')} company")
+    
+    elif networking_goal == "Job Seeking":
+        if contact.get("seniority") in ["Manager", "Director", "VP"]:
+            insights.append(f"Hiring authority ({contact.get('seniority')})")
+        
+        if contact.get("company"):
+            insights.append(f"Works at target company ({contact.get('company')})")
+    
+    # Custom goal insights
+    if goal_tokens:
+        for field in CUSTOM_GOAL_FIELDS:
+            value = contact.get(field, "")
+            if value and any(token in goal_tokens for token in value.lower().split()):
+                insights.append(f"Matches your goal: {value}")
+                break
+    
+    # Fill with more generic insights if needed
+    if len(insights) < 2:
+        potential_insights = [
+            f"Experienced in {contact.get('expertise').split(',')[0] if contact.get('expertise') and ',' in contact.get('expertise') else contact.get('expertise', 'professional skills')}",
+            f"Works at {contact.get('company', 'a company')}",
+            f"{contact.get('seniority', 'Professional')} level position",
+            f"Connected on {contact.get('connectedDate', 'LinkedIn')}"
+        ]
+        # Seeded mode picks the same generic insights for a contact every time
+        rng = random if seed is None else random.Random(f"{seed}:{contact.get('fullName')}:{contact.get('company')}")
+        insights.extend(rng.sample(potential_insights, min(2, len(potential_insights))))
+    
+    # Take only the top 3 insights
+    return insights[:3]
+
+def match_strength(score):
+    """Describe how strong a match a score represents"""
+    if score >= 80:
+        return "Exceptional Match"
+    elif score >= 65:
+        return "Strong Match"
+    elif score >= 50:
+        return "Good Match"
+    else:
+        return "Moderate Match"
+
+class Recommendation(Mapping):
+    """Dict-like recommended contact whose insights are generated on first access"""
+    
+    EXTRA_FIELDS = ("score", "insights", "matchStrength")
+    
+    def __init__(self, contact, score, insight_context):
+        self.contact = contact
+        self.score = score
+        self.insight_context = insight_context
+        self.insights = None
+    
+    def __getitem__(self, field):
+        if field == "score":
+            return self.score
+        if field == "matchStrength":
+            return match_strength(self.score)
+        if field == "insights":
+            if self.insights is None:
+                self.insights = generate_insights(self.contact, **self.insight_context)
+            return self.insights
+        return self.contact[field]
+    
+    def __iter__(self):
+        yield from self.contact
+        yield from self.EXTRA_FIELDS
+    
+    def __len__(self):
+        return len(self.contact) + len(self.EXTRA_FIELDS)
+
+def generate_recommendations(count=30, timings=None):
+    """Generate AI-powered contact recommendations, recording each stage's wall time in timings if given"""
+    connections = st.session_state.linkedin_connections
+    if not connections:
+        return []
+    
+    scores, ranked = rank_connections(count, timings)
+    start = time.perf_counter()
+    insight_context = recommendation_insight_context()
+    recommendations = [
+        Recommendation(connections[int(index)], int(scores[index]), insight_context)
+        for index in ranked
+    ]
+    if timings is not None:
+        # Insights are otherwise generated lazily, so generate them here to measure them
+        for recommendation in recommendations:
+            recommendation["insights"]
+        timings["Insights"] = time.perf_counter() - start
+    return recommendations
+
+def recommendation_inputs(count):
+    """Return everything a recommendation ranking depends on, to tell when it is out of date"""
+    return (
+        st.session_state.linkedin_connections,
+        st.session_state.user_profile.get("industry"),
+        st.session_state.user_profile.get("headline"),
+        st.session_state.networking_goal,
+        st.session_state.get("custom_goal", ""),
+        st.session_state.get("scoring_seed"),
+        count
+    )
+
+def refresh_recommendations(count=30):
+    """Regenerate recommendations and record stage timings, unless their inputs are unchanged"""
+    inputs = recommendation_inputs(count)
+    if st.session_state.recommendations and st.session_state.get("recommendation_inputs") == inputs:
+        st.session_state.refresh_timings = {"skipped": True}
+        return
+    
+    timings = {}
+    start = time.perf_counter()
+    st.session_state.recommendations = generate_recommendations(count, timings)
+    timings["Total"] = time.perf_counter() - start
+    st.session_state.recommendation_inputs = inputs
+    st.session_state.refresh_timings = timings
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def seeded_ranking(fingerprint, industry, networking_goal, custom_goal, seed, count, _get_scorer):
+    """Score and rank a seeded run, memoized since the result depends only on these arguments"""
+    scores = _get_scorer().scores(networking_goal, custom_goal)
+    return scores, top_k_indices(scores, count)
+
+def rank_connections(count, timings=None):
+    """Return the current connection scores and the indices of the top count connections"""
+    timings = {} if timings is None else timings
+    seed = st.session_state.get("scoring_seed")
+    if seed is None:
+        start = time.perf_counter()
+        scores = update_connection_scores()
+        timings["Scoring"] = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        ranked = top_k_indices(scores, count)
+        timings["Ranking"] = time.perf_counter() - start
+        return scores, ranked
+    
+    # Seeded rankings are reused across reruns and sessions with the same connections and inputs
+    start = time.perf_counter()
+    scores, ranked = seeded_ranking(
+        st.session_state.linkedin_connections.fingerprint(),
+        st.session_state.user_profile.get("industry"),
+        st.session_state.networking_goal,
+        st.session_state.get("custom_goal", ""),
+        seed,
+        count,
+        get_connection_scorer
+    )
+    timings["Scoring and ranking (seeded, memoized)"] = time.perf_counter() - start
+    st.session_state.connection_scores = scores
+    return scores, ranked
+
+def update_connection_scores():
+    """Score the whole network for the current goal and keep the scores in the session"""
+    # Only the goal bonus is recomputed when just the networking goal changes
+    scores = get_connection_scorer().scores(
+        st.session_state.networking_goal,
+        st.session_state.get("custom_goal", "")
+    )
+    st.session_state.connection_scores = scores
+    return scores
+
+def recommendation_insight_context():
+    """Return the goal and profile that recommendation insights are generated for"""
+    # Insights are only generated for the recommendations that actually get displayed
+    return {
+        "networking_goal": st.session_state.networking_goal,
+        "user_profile": st.session_state.user_profile,
+        # Tokens containing a custom goal term, looked up in the same index the goal bonus uses
+        "goal_tokens": st.session_state.linkedin_connections.goal_index.matching_tokens(
+            custom_goal_terms(st.session_state.get("custom_goal", ""))
+        ),
+        "seed": st.session_state.get("scoring_seed")
+    }
+
+def search_recommendations(query):
+    """Search the whole network, returning matching connection indices best first"""
+    connections = st.session_state.linkedin_connections
+    if not connections:
+        return np.empty(0, dtype=np.int64)
     
-    # Sort by score and return top recommendations
-    return sorted(scored_contacts, key=lambda x: x["score"], reverse=True)[:count]
+    # Rank equally relevant matches by their recommendation score
+    scores = st.session_state.get("connection_scores")
+    if scores is None or len(scores) != len(connections):
+        scores = update_connection_scores()
+    
+    return connections.search_index.search(query, scores)
+
+def recommendations_for(indices):
+    """Build recommendations for connections given by index, using their current scores"""
+    connections = st.session_state.linkedin_connections
+    scores = st.session_state.connection_scores
+    insight_context = recommendation_insight_context()
+    return [Recommendation(connections[int(index)], int(scores[index]), insight_context) for index in indices]
 
 def generate_conversation_starters(contact):
     """Generate conversation starters for a contact"""
@@ -954,42 +2021,10 @@ def generate_conversation_starters(contact):
     
     return starters[:3]
 
-def generate_basic_message(contact, template_type="coldOutreach", custom_topic=""):
-    """Generate a basic outreach message without using Claude AI"""
-    # Create a replacement dictionary
-    replacements = {
-        "{{firstName}}": contact.get("firstName", ""),
-        "{{industry}}": contact.get("industry", "our industry"),
-        "{{company}}": contact.get("company", "your company"),
-        "{{expertise}}": contact.get("expertise", "your professional expertise").split(",")[0] if contact.get("expertise") and "," in contact.get("expertise") else contact.get("expertise", "your expertise"),
-        "{{userRole}}": st.session_state.user_profile.get("headline", "").split(" at ")[0] if " at " in st.session_state.user_profile.get("headline", "") else st.session_state.user_profile.get("headline", "professional"),
-        "{{userExpertise}}": extract_expertise_from_headline(st.session_state.user_profile.get("headline", "")),
-        "{{userName}}": st.session_state.user_profile.get("name", ""),
-        "{{specificTopic}}": custom_topic if custom_topic else f"{contact.get('expertise', 'your expertise').split(',')[0] if contact.get('expertise') and ',' in contact.get('expertise') else contact.get('expertise', 'your field')} in {contact.get('industry', 'the industry')}"
-    }
-    
-    # Add goal-specific replacements
-    if st.session_state.networking_goal == "Career Advancement":
-        replacements["{{goalContext}}"] = "advancing my career in our industry"
-    elif st.session_state.networking_goal == "Industry Knowledge":
-        replacements["{{goalContext}}"] = "deepening my knowledge about current trends and best practices"
-    elif st.session_state.networking_goal == "Business Development":
-        replacements["{{goalContext}}"] = "exploring potential collaboration opportunities"
-    elif st.session_state.networking_goal == "Job Seeking":
-        replacements["{{goalContext}}"] = "exploring new career opportunities in our field"
-    else:
-        replacements["{{goalContext}}"] = "expanding my professional network"
-    
-    # Add custom goal if specified
-    custom_goal = st.session_state.get("custom_goal", "")
-    if custom_goal:
-        replacements["{{customGoal}}"] = custom_goal
-        replacements["{{goalContext}}"] = f"{replacements['{{goalContext}}']} with a focus on {custom_goal}"
-    
-    # Template selection
-    templates = {
-        "coldOutreach": [
-            """Hi {{firstName}},
+# Outreach message templates by message type, with {{placeholder}} slots
+MESSAGE_TEMPLATES = {
+    "coldOutreach": [
+        """Hi {{firstName}},
 
 I hope this message finds you well. I noticed your work in {{industry}} at {{company}}. Your expertise in {{expertise}} particularly caught my attention.
 
@@ -999,8 +2034,8 @@ Would you be open to a brief conversation in the coming weeks? I'd appreciate th
 
 Thanks for considering,
 {{userName}}""",
-            
-            """Hello {{firstName}},
+        
+        """Hello {{firstName}},
 
 I came across your profile and was impressed by your background in {{expertise}} and your work at {{company}}.
 
@@ -1010,9 +2045,9 @@ I'd value the opportunity to exchange ideas with someone of your expertise. Woul
 
 Best regards,
 {{userName}}"""
-        ],
-        "followUp": [
-            """Hi {{firstName}},
+    ],
+    "followUp": [
+        """Hi {{firstName}},
 
 I hope you're doing well. I wanted to follow up on my previous message about connecting to discuss {{specificTopic}}.
 
@@ -1022,9 +2057,9 @@ If your schedule permits, I'd still appreciate that brief conversation we discus
 
 All the best,
 {{userName}}"""
-        ],
-        "informationalInterview": [
-            """Hi {{firstName}},
+    ],
+    "informationalInterview": [
+        """Hi {{firstName}},
 
 I hope this message finds you well. I'm {{userName}}, a {{userRole}} with a background in {{userExpertise}}.
 
@@ -1038,20 +2073,77 @@ Thank you for considering my request. I appreciate your time.
 
 Best regards,
 {{userName}}"""
-        ]
+    ]
+}
+
+# Placeholders in message templates
+TEMPLATE_PLACEHOLDER = re.compile(r"\{\{(\w+)\}\}")
+
+def compile_message_template(template):
+    """Split a template into segments: literal text at even indices and placeholder names at odd indices"""
+    return TEMPLATE_PLACEHOLDER.split(template)
+
+# Templates are split into segments once, so rendering is a single join
+COMPILED_MESSAGE_TEMPLATES = {
+    template_type: [compile_message_template(template) for template in templates]
+    for template_type, templates in MESSAGE_TEMPLATES.items()
+}
+
+# Phrase describing each networking goal in template messages
+GOAL_CONTEXTS = {
+    "Career Advancement": "advancing my career in our industry",
+    "Industry Knowledge": "deepening my knowledge about current trends and best practices",
+    "Business Development": "exploring potential collaboration opportunities",
+    "Job Seeking": "exploring new career opportunities in our field"
+}
+
+def sender_template_values():
+    """Return the template values that are the same for every contact"""
+    headline = st.session_state.user_profile.get("headline", "")
+    values = {
+        "userRole": headline.split(" at ")[0] if " at " in headline else st.session_state.user_profile.get("headline", "professional"),
+        "userExpertise": extract_expertise_from_headline(headline),
+        "userName": st.session_state.user_profile.get("name", ""),
+        "goalContext": GOAL_CONTEXTS.get(st.session_state.networking_goal, "expanding my professional network")
     }
     
-    # Get templates for the requested type or default to cold outreach
-    selected_templates = templates.get(template_type, templates["coldOutreach"])
-    
-    # Choose a random template
-    template = random.choice(selected_templates)
-    
-    # Apply all replacements
-    for key, value in replacements.items():
-        template = template.replace(key, value)
+    # Add custom goal if specified
+    custom_goal = st.session_state.get("custom_goal", "")
+    if custom_goal:
+        values["customGoal"] = custom_goal
+        values["goalContext"] = f"{values['goalContext']} with a focus on {custom_goal}"
+    return values
+
+def contact_template_values(contact, custom_topic=""):
+    """Return the template values that depend on the contact"""
+    expertise = contact.get("expertise")
+    return {
+        "firstName": contact.get("firstName", ""),
+        "industry": contact.get("industry", "our industry"),
+        "company": contact.get("company", "your company"),
+        "expertise": expertise.split(",")[0] if expertise and "," in expertise else contact.get("expertise", "your expertise"),
+        "specificTopic": custom_topic if custom_topic else f"{expertise.split(',')[0] if expertise and ',' in expertise else contact.get('expertise', 'your field')} in {contact.get('industry', 'the industry')}"
+    }
+
+def render_message_template(segments, values):
+    """Fill a compiled template's placeholders, leaving unknown ones as they are"""
+    parts = segments.copy()
+    parts[1::2] = [values.get(name, f"{{{{{name}}}}}") for name in segments[1::2]]
+    return "".join(parts)
+
+def generate_basic_message(contact, template_type="coldOutreach", custom_topic="", sender_values=None):
+    """Generate a basic outreach message without using Claude AI"""
+    # Sender values can be passed in when rendering for many contacts, as they do not change
+    values = {**(sender_values or sender_template_values()), **contact_template_values(contact, custom_topic)}
     
-    return template
+    # Choose a random template for the requested type or default to cold outreach
+    template = random.choice(COMPILED_MESSAGE_TEMPLATES.get(template_type, COMPILED_MESSAGE_TEMPLATES["coldOutreach"]))
+    return render_message_template(template, values)
+
+def generate_basic_messages(contacts, template_type="coldOutreach", custom_topic=""):
+    """Generate basic outreach messages for many contacts, computing the sender values once"""
+    sender_values = sender_template_values()
+    return [generate_basic_message(contact, template_type, custom_topic, sender_values) for contact in contacts]
 
 def extract_expertise_from_headline(headline):
     """Extract expertise from LinkedIn headline"""
@@ -1078,17 +2170,8 @@ def extract_expertise_from_headline(headline):
     # If no structure is found, return the headline as is or a generic expertise
     return headline or "professional skills"
 
-def generate_claude_message(contact, template_type="coldOutreach", custom_topic=""):
-    """Generate a message using Claude AI"""
-    client = initialize_claude_client()
-    
-    # If Claude client initialization failed or API key not provided, fall back to basic generation
-    if not client:
-        return generate_basic_message(contact, template_type, custom_topic)
-    
-    try:
-        # Prepare the prompt
-        system_prompt = """You are an expert networking assistant that specializes in crafting personalized, effective LinkedIn outreach messages. 
+# Static system prompts for each kind of Claude request
+MESSAGE_SYSTEM_PROMPT = """You are an expert networking assistant that specializes in crafting personalized, effective LinkedIn outreach messages. 
 Your task is to create a tailored networking message based on:
 1. The sender's profile
 2. The recipient's profile 
@@ -1109,10 +2192,92 @@ Craft a message that is:
 
 Return only the text of the message itself, without any explanation or commentary."""
 
-        # Create a detailed prompt with all the context
-        specific_topic = custom_topic if custom_topic else f"{contact.get('expertise', 'your field').split(',')[0] if contact.get('expertise') and ',' in contact.get('expertise') else contact.get('expertise', 'your field')}"
-        
-        user_prompt = f"""Create a personalized LinkedIn {template_type} message to {contact.get('firstName', '')} {contact.get('lastName', '')}.
+ANALYSIS_SYSTEM_PROMPT = """You are an expert LinkedIn networking message analyst. Evaluate the provided LinkedIn outreach message based on:
+
+1. Personalization - Does it show research and include specific details about the recipient?
+2. Value proposition - Is it clear why connecting would be beneficial?
+3. Authenticity - Does it sound genuine rather than generic or salesy?
+4. Call to action - Is there a clear, low-friction next step?
+5. Focus - Is it concise (under 150 words) and focused?
+6. LinkedIn appropriateness - Is it optimized for LinkedIn specifically?
+7. Goal alignment - Does it align with the stated networking goal?
+
+Submit your analysis with the submit_message_analysis tool:
+- overallScore: integer between 0-100
+- strengths: 2-4 specific strengths
+- weaknesses: 0-3 specific weaknesses
+- suggestions: 0-3 specific improvement suggestions
+- assessment: 1-2 sentence overall assessment"""
+
+IMPROVEMENT_SYSTEM_PROMPT = """You are an expert LinkedIn networking message editor. Your task is to improve the provided outreach message while keeping its core intent and content.
+
+Focus on enhancing:
+1. Personalization - Add specific details about the recipient
+2. Value proposition - Clarify why connecting would be beneficial
+3. Authenticity - Make it sound more genuine and less generic
+4. Call to action - Ensure there's a clear, low-friction next step
+5. Conciseness - Keep it under 150 words and focused
+6. LinkedIn optimization - Make it specifically tailored for LinkedIn messaging
+7. Goal alignment - Ensure it clearly aligns with the stated networking goal
+
+Return ONLY the improved message text without any explanation or commentary about your changes."""
+
+# Fields of a message analysis, which Claude returns through a tool call so they arrive parsed and validated
+MESSAGE_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "overallScore": {"type": "integer", "minimum": 0, "maximum": 100},
+        "strengths": {"type": "array", "items": {"type": "string"}, "minItems": 2, "maxItems": 4},
+        "weaknesses": {"type": "array", "items": {"type": "string"}, "maxItems": 3},
+        "suggestions": {"type": "array", "items": {"type": "string"}, "maxItems": 3},
+        "assessment": {"type": "string"}
+    },
+    "required": ["overallScore", "strengths", "weaknesses", "suggestions", "assessment"],
+    "additionalProperties": False
+}
+
+MESSAGE_ANALYSIS_TOOL = {
+    "name": "submit_message_analysis",
+    "description": "Submit the analysis of the outreach message.",
+    "input_schema": MESSAGE_ANALYSIS_SCHEMA
+}
+
+def sender_context(include_profile=True, include_summary=False):
+    """Describe the sender and their networking goal, which stay the same across recipients"""
+    profile = st.session_state.user_profile
+    context = ""
+    if include_profile:
+        summary = profile.get('summary', '')
+        context += f"""SENDER'S PROFILE:
+- Name: {profile.get('name', '')}
+- Role/Headline: {profile.get('headline', '')}
+- Industry: {profile.get('industry', '')}
+"""
+        if include_summary:
+            context += f"- Summary: {summary[:200] + '...' if summary and len(summary) > 200 else summary}\n"
+        context += "\n"
+    
+    context += f"""SENDER'S GOAL:
+- Primary Networking Goal: {st.session_state.networking_goal}
+"""
+    if st.session_state.get("custom_goal"):
+        context += f"- Specific Networking Objective: {st.session_state.custom_goal}\n"
+    return context
+
+def cached_system_prompt(system_prompt, sender):
+    """Build system prompt blocks with prompt caching breakpoints after the static prompt and the sender context"""
+    # Everything up to a breakpoint is cached, so only the per-recipient user message is processed anew
+    return [
+        {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": sender, "cache_control": {"type": "ephemeral"}}
+    ]
+
+def build_message_request(contact, template_type="coldOutreach", custom_topic=""):
+    """Build the Messages API request that writes an outreach message to a contact"""
+    # Create a detailed prompt with the recipient context; the sender context is in the cached system prompt
+    specific_topic = custom_topic if custom_topic else f"{contact.get('expertise', 'your field').split(',')[0] if contact.get('expertise') and ',' in contact.get('expertise') else contact.get('expertise', 'your field')}"
+    
+    user_prompt = f"""Create a personalized LinkedIn {template_type} message to {contact.get('firstName', '')} {contact.get('lastName', '')}.
 
 RECIPIENT'S PROFILE:
 - Name: {contact.get('firstName', '')} {contact.get('lastName', '')}
@@ -1124,49 +2289,154 @@ RECIPIENT'S PROFILE:
 - Connected on LinkedIn since: {contact.get('connectedDate', 'some time ago')}
 - Mutual Connections: {contact.get('mutualConnections', 0)}
 
-SENDER'S PROFILE:
-- Name: {st.session_state.user_profile.get('name', '')}
-- Role/Headline: {st.session_state.user_profile.get('headline', '')}
-- Industry: {st.session_state.user_profile.get('industry', '')}
-- Summary: {st.session_state.user_profile.get('summary', '')[:200] + '...' if st.session_state.user_profile.get('summary') and len(st.session_state.user_profile.get('summary')) > 200 else st.session_state.user_profile.get('summary', '')}
-
 MESSAGE DETAILS:
 - Message Type: {template_type}
-- Primary Networking Goal: {st.session_state.networking_goal}
 - Specific Topic of Interest: {specific_topic}
 """
 
-        # Add custom goal if specified
-        if st.session_state.get("custom_goal"):
-            user_prompt += f"- Specific Networking Objective: {st.session_state.custom_goal}\n"
-
-        user_prompt += f"\nCreate a personalized {template_type} message based on this information that furthers the networking goal of {st.session_state.networking_goal}"
-        
-        if st.session_state.get("custom_goal"):
-            user_prompt += f" with a focus on the specific objective: {st.session_state.custom_goal}"
-        
-        user_prompt += "."
-
-        # Send request to Claude
-        with st.spinner("Generating personalized message with Claude AI..."):
-            response = client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=500,
-                system=system_prompt,
-                messages=[
-                    {"role": "user", "content": user_prompt}
-                ]
-            )
-        
-        # Extract the message
-        message = response.content[0].text
-        return message
+    user_prompt += f"\nCreate a personalized {template_type} message based on this information that furthers the networking goal of {st.session_state.networking_goal}"
+    
+    if st.session_state.get("custom_goal"):
+        user_prompt += f" with a focus on the specific objective: {st.session_state.custom_goal}"
+    
+    user_prompt += "."
+    
+    return {
+        "model": CLAUDE_MODEL,
+        "max_tokens": 500,
+        "system": cached_system_prompt(MESSAGE_SYSTEM_PROMPT, sender_context(include_summary=True)),
+        "messages": [
+            {"role": "user", "content": user_prompt}
+        ]
+    }
+
+def generate_claude_message(contact, template_type="coldOutreach", custom_topic="", stream=False):
+    """Generate a message using Claude AI, optionally showing its text as it streams in"""
+    client = initialize_claude_client()
+    
+    # If Claude client initialization failed or API key not provided, fall back to basic generation
+    if not client:
+        return generate_basic_message(contact, template_type, custom_topic)
+    
+    try:
+        request = build_message_request(contact, template_type, custom_topic)
+        
+        if stream:
+            # Write tokens where the message goes as they arrive, then clear them for the final message
+            placeholder = st.empty()
+            limiter = get_claude_rate_limiter()
+            breaker = get_claude_circuit_breaker()
+            # Text already shown cannot be taken back, so a failed stream is not retried
+            breaker.check()
+            reservation = limiter.acquire(request)
+            usage = None
+            try:
+                with client.with_options(max_retries=0, timeout=CLAUDE_CALL_DEADLINE).messages.stream(**request) as response_stream:
+                    message = placeholder.write_stream(response_stream.text_stream)
+                    usage = response_stream.get_final_message().usage
+            except Exception as e:
+                # Partial text must not stay above the template the caller falls back to
+                placeholder.empty()
+                record_claude_outcome(breaker, e)
+                raise
+            except BaseException:
+                # Streamlit stops an interrupted script run by raising through here, which says nothing about the API
+                breaker.abandon()
+                raise
+            finally:
+                limiter.settle(reservation, usage)
+            record_claude_outcome(breaker)
+            placeholder.empty()
+            return message
+        
+        # Send request to Claude
+        with st.spinner("Generating personalized message with Claude AI..."):
+            response = send_claude_request(client, request)
+        
+        # Extract the message
+        message = response.content[0].text
+        return message
     
     except Exception as e:
         st.error(f"Error generating message with Claude: {e}")
         # Fall back to basic generation
         return generate_basic_message(contact, template_type, custom_topic)
 
+def build_analysis_request(message, contact):
+    """Build the Messages API request that analyzes an outreach message"""
+    user_prompt = f"""Analyze this LinkedIn networking outreach message to {contact.get('firstName', '')} {contact.get('lastName', '')}, who is a {contact.get('role', 'professional')} at {contact.get('company', 'their company')} in the {contact.get('industry', 'their industry')} industry:
+
+MESSAGE:
+{message}
+
+RECIPIENT CONTEXT:
+- Expertise: {contact.get('expertise', 'their expertise')}
+- Seniority: {contact.get('seniority', 'professional')}
+- Connected On: {contact.get('connectedDate', 'some time ago')}
+
+Evaluate this message and submit your feedback with the analysis tool."""
+
+    return {
+        "model": CLAUDE_MODEL,
+        "max_tokens": 500,
+        "system": cached_system_prompt(ANALYSIS_SYSTEM_PROMPT, sender_context(include_profile=False)),
+        "tools": [MESSAGE_ANALYSIS_TOOL],
+        "tool_choice": {"type": "tool", "name": MESSAGE_ANALYSIS_TOOL["name"]},
+        "messages": [
+            {"role": "user", "content": user_prompt}
+        ]
+    }
+
+def tool_input(response, tool_name):
+    """Return the input Claude passed to a tool, or raise ValueError if it did not call it"""
+    for block in response.content:
+        if block.type == "tool_use" and block.name == tool_name:
+            return block.input
+    raise ValueError(f"Claude did not call the {tool_name} tool")
+
+def validate_message_analysis(analysis):
+    """Check a message analysis has MESSAGE_ANALYSIS_SCHEMA's fields and types, trimming lists to its maxItems"""
+    properties = MESSAGE_ANALYSIS_SCHEMA["properties"]
+    if not isinstance(analysis, dict) or set(analysis) != set(MESSAGE_ANALYSIS_SCHEMA["required"]):
+        raise ValueError("Message analysis has missing or unexpected fields")
+    score = analysis["overallScore"]
+    # JSON has no separate integer type, so a whole float such as 82.0 is still an integer
+    if isinstance(score, float) and score.is_integer():
+        score = int(score)
+    score_range = properties["overallScore"]
+    if isinstance(score, bool) or not isinstance(score, int) or not score_range["minimum"] <= score <= score_range["maximum"]:
+        raise ValueError(f"Invalid overallScore: {analysis['overallScore']!r}")
+    for field in ("strengths", "weaknesses", "suggestions"):
+        items = analysis[field]
+        if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+            raise ValueError(f"{field} must be a list of strings")
+        # A list longer than the schema allows is still usable, so it is cut down rather than thrown away
+        analysis[field] = items[:properties[field].get("maxItems", len(items))]
+    if not isinstance(analysis["assessment"], str):
+        raise ValueError("assessment must be a string")
+    analysis["overallScore"] = score
+    return analysis
+
+def parse_message_analysis(response):
+    """Return the validated analysis submitted through the analysis tool"""
+    return validate_message_analysis(tool_input(response, MESSAGE_ANALYSIS_TOOL["name"]))
+
+def record_analysis_parse_failure(request, error):
+    """Count an analysis Claude returned in an unreadable form, and keep it out of the response cache"""
+    st.session_state.analysis_parse_failures = st.session_state.get("analysis_parse_failures", 0) + 1
+    get_response_cache().discard(request)
+    st.error(f"Claude returned a message analysis that could not be read: {error}")
+
+def failed_message_analysis(error):
+    """Return the analysis shown when Claude analysis fails"""
+    return {
+        "overallScore": 50,
+        "strengths": ["Basic message format"],
+        "weaknesses": ["Error in Claude analysis", str(error)],
+        "suggestions": ["Try again or check API key configuration"],
+        "assessment": "Message analysis failed due to an error"
+    }
+
 def analyze_message_with_claude(message, contact):
     """Analyze a message using Claude AI"""
     client = initialize_claude_client()
@@ -1181,8 +2451,87 @@ def analyze_message_with_claude(message, contact):
         }
     
     try:
-        system_prompt = """You are an expert LinkedIn networking message analyst. Evaluate the provided LinkedIn outreach message based on:
+        request = build_analysis_request(message, contact)
+        
+        # Send request to Claude
+        with st.spinner("Analyzing message with Claude AI..."):
+            response = create_cached_claude_message(client, request)
+        
+        return parse_message_analysis(response)
+    
+    except ValueError as e:
+        record_analysis_parse_failure(request, e)
+        return None
+    
+    except Exception as e:
+        st.error(f"Error analyzing message with Claude: {e}")
+        return failed_message_analysis(e)
+
+def build_improvement_request(message, contact):
+    """Build the Messages API request that improves an outreach message"""
+    user_prompt = f"""Improve this LinkedIn networking outreach message to {contact.get('firstName', '')} {contact.get('lastName', '')}, who is a {contact.get('role', 'professional')} at {contact.get('company', 'their company')} in the {contact.get('industry', 'their industry')} industry:
+
+ORIGINAL MESSAGE:
+{message}
+
+RECIPIENT DETAILS:
+- Expertise: {contact.get('expertise', 'their expertise')}
+- Seniority: {contact.get('seniority', 'professional')}
+- Connected On: {contact.get('connectedDate', 'some time ago')}
+- Mutual Connections: {contact.get('mutualConnections', 0)}
+"""
+
+    user_prompt += "\nImprove this message while keeping its core intent. Return only the improved message text."
+
+    return {
+        "model": CLAUDE_MODEL,
+        "max_tokens": 500,
+        "system": cached_system_prompt(IMPROVEMENT_SYSTEM_PROMPT, sender_context()),
+        "messages": [
+            {"role": "user", "content": user_prompt}
+        ]
+    }
+
+def improve_message_with_claude(message, contact):
+    """Improve a message using Claude AI"""
+    client = initialize_claude_client()
+    
+    if not client:
+        return message
+    
+    try:
+        request = build_improvement_request(message, contact)
+        
+        # Send request to Claude
+        with st.spinner("Improving message with Claude AI..."):
+            response = create_cached_claude_message(client, request)
+        
+        # Extract the improved message
+        improved_message = response.content[0].text
+        return improved_message
+    
+    except Exception as e:
+        st.error(f"Error improving message with Claude: {e}")
+        return message
 
+# Tool the combined review request must call, so the analysis and improved message come back in a fixed schema
+MESSAGE_REVIEW_TOOL = {
+    "name": "submit_message_review",
+    "description": "Submit the analysis of the original outreach message and the improved message.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "analysis": MESSAGE_ANALYSIS_SCHEMA,
+            "improvedMessage": {"type": "string", "description": "The improved message text only"}
+        },
+        "required": ["analysis", "improvedMessage"],
+        "additionalProperties": False
+    }
+}
+
+REVIEW_SYSTEM_PROMPT = """You are an expert LinkedIn networking message analyst and editor. First evaluate the provided LinkedIn outreach message, then improve it while keeping its core intent and content.
+
+Evaluate and improve the message on:
 1. Personalization - Does it show research and include specific details about the recipient?
 2. Value proposition - Is it clear why connecting would be beneficial?
 3. Authenticity - Does it sound genuine rather than generic or salesy?
@@ -1191,140 +2540,449 @@ def analyze_message_with_claude(message, contact):
 6. LinkedIn appropriateness - Is it optimized for LinkedIn specifically?
 7. Goal alignment - Does it align with the stated networking goal?
 
-Provide your analysis in JSON format with these fields:
-- overallScore: number between 0-100
-- strengths: array of strings (2-4 specific strengths)
-- weaknesses: array of strings (0-3 specific weaknesses)
-- suggestions: array of strings (0-3 specific improvement suggestions)
-- assessment: string (1-2 sentence overall assessment)
-
-Return ONLY the JSON object without any additional text or explanation."""
+Submit your review with the submit_message_review tool:
+- analysis.overallScore: integer between 0-100 for the original message
+- analysis.strengths: 2-4 specific strengths
+- analysis.weaknesses: 0-3 specific weaknesses
+- analysis.suggestions: 0-3 specific improvement suggestions
+- analysis.assessment: 1-2 sentence overall assessment
+- improvedMessage: the improved message text, without any explanation or commentary about your changes"""
 
-        user_prompt = f"""Analyze this LinkedIn networking outreach message to {contact.get('firstName', '')} {contact.get('lastName', '')}, who is a {contact.get('role', 'professional')} at {contact.get('company', 'their company')} in the {contact.get('industry', 'their industry')} industry:
+def build_review_request(message, contact):
+    """Build the Messages API request that analyzes and improves an outreach message in one call"""
+    user_prompt = f"""Analyze and improve this LinkedIn networking outreach message to {contact.get('firstName', '')} {contact.get('lastName', '')}, who is a {contact.get('role', 'professional')} at {contact.get('company', 'their company')} in the {contact.get('industry', 'their industry')} industry:
 
 MESSAGE:
 {message}
 
-RECIPIENT CONTEXT:
+RECIPIENT DETAILS:
 - Expertise: {contact.get('expertise', 'their expertise')}
 - Seniority: {contact.get('seniority', 'professional')}
 - Connected On: {contact.get('connectedDate', 'some time ago')}
+- Mutual Connections: {contact.get('mutualConnections', 0)}
+"""
 
-SENDER GOAL:
-- Networking Goal: {st.session_state.networking_goal}
+    return {
+        "model": CLAUDE_MODEL,
+        "max_tokens": 1000,
+        "system": cached_system_prompt(REVIEW_SYSTEM_PROMPT, sender_context()),
+        "tools": [MESSAGE_REVIEW_TOOL],
+        "tool_choice": {"type": "tool", "name": MESSAGE_REVIEW_TOOL["name"]},
+        "messages": [
+            {"role": "user", "content": user_prompt}
+        ]
+    }
 
-Evaluate this message and provide feedback in the required JSON format."""
+def parse_message_review(response):
+    """Return the validated (analysis, improved message) submitted through the review tool"""
+    review = tool_input(response, MESSAGE_REVIEW_TOOL["name"])
+    if not isinstance(review.get("improvedMessage"), str):
+        raise ValueError("improvedMessage must be a string")
+    return validate_message_analysis(review.get("analysis")), review["improvedMessage"]
 
-        # Send request to Claude
-        with st.spinner("Analyzing message with Claude AI..."):
-            response = client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=500,
-                system=system_prompt,
-                messages=[
-                    {"role": "user", "content": user_prompt}
-                ]
-            )
+def analyze_and_improve_message_with_claude(message, contact):
+    """Analyze and improve a message with a single Claude request"""
+    client = initialize_claude_client()
+    
+    if not client:
+        return analyze_message_with_claude(message, contact), message
+    
+    try:
+        request = build_review_request(message, contact)
         
-        # Extract and parse the JSON response
-        try:
-            analysis_text = response.content[0].text
-            # Find JSON content - in case Claude includes any extra text
-            import re
-            json_match = re.search(r'({[\s\S]*})', analysis_text)
-            
-            if json_match:
-                analysis_json = json.loads(json_match.group(1))
-                return analysis_json
-            else:
-                # If no JSON found, create a simple response
-                return {
-                    "overallScore": 65,
-                    "strengths": ["Message structure is appropriate"],
-                    "weaknesses": ["Could not extract detailed analysis"],
-                    "suggestions": ["Try again with more specific message content"],
-                    "assessment": "Basic networking message that needs refinement"
-                }
+        with st.spinner("Analyzing and improving message with Claude AI..."):
+            response = create_cached_claude_message(client, request)
         
-        except json.JSONDecodeError:
-            return {
-                "overallScore": 60,
-                "strengths": ["Message has been drafted"],
-                "weaknesses": ["Could not parse Claude analysis"],
-                "suggestions": ["Try again with simpler message structure"],
-                "assessment": "Message analysis encountered an error"
-            }
+        return parse_message_review(response)
+    
+    except ValueError as e:
+        record_analysis_parse_failure(request, e)
+        return None, message
     
     except Exception as e:
-        st.error(f"Error analyzing message with Claude: {e}")
-        return {
-            "overallScore": 50,
-            "strengths": ["Basic message format"],
-            "weaknesses": ["Error in Claude analysis", str(e)],
-            "suggestions": ["Try again or check API key configuration"],
-            "assessment": "Message analysis failed due to an error"
+        st.error(f"Error analyzing and improving message with Claude: {e}")
+        return failed_message_analysis(e), message
+
+# Concurrent Claude requests for bulk message generation
+BULK_CONCURRENCY = 5
+
+def generate_bulk_messages(contacts, template_type="coldOutreach", custom_topic="", concurrency=BULK_CONCURRENCY, on_result=None):
+    """Generate messages for many contacts with a bounded pool of concurrent Claude requests"""
+    results = [None] * len(contacts)
+    
+    def record(index, message, source):
+        contact = contacts[index]
+        results[index] = {
+            "Name": f"{contact.get('firstName', '')} {contact.get('lastName', '')}".strip(),
+            "Company": contact.get("company", ""),
+            "Role": contact.get("role", ""),
+            "Message Type": template_type,
+            "Message": message,
+            "Source": source
         }
-
-def improve_message_with_claude(message, contact):
-    """Improve a message using Claude AI"""
-    client = initialize_claude_client()
+        if on_result:
+            on_result([result for result in results if result])
     
+    client = initialize_claude_client(async_client=True)
     if not client:
-        return message
+        for index, message in enumerate(generate_basic_messages(contacts, template_type, custom_topic)):
+            record(index, message, "Template")
+        return results
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = get_claude_rate_limiter()
+    breaker = get_claude_circuit_breaker()
+    loop = get_claude_event_loop()
+    
+    async def send_within_pool(request):
+        async with semaphore:
+            return await send_claude_request_async(client, request, limiter, breaker)
+    
+    # Requests are built here because session state is only available on the script thread
+    futures = {}
+    for index, contact in enumerate(contacts):
+        request = build_message_request(contact, template_type, custom_topic)
+        future = asyncio.run_coroutine_threadsafe(send_within_pool(request), loop)
+        futures[future] = index
+    
+    # Record results as they finish, falling back to a template for failed requests
+    sender_values = sender_template_values()
+    for future in concurrent.futures.as_completed(futures):
+        index = futures[future]
+        try:
+            record(index, future.result().content[0].text, "Claude AI")
+        except Exception:
+            record(index, generate_basic_message(contacts[index], template_type, custom_topic, sender_values), "Template (fallback)")
     
-    try:
-        system_prompt = """You are an expert LinkedIn networking message editor. Your task is to improve the provided outreach message while keeping its core intent and content.
+    return results
 
-Focus on enhancing:
-1. Personalization - Add specific details about the recipient
-2. Value proposition - Clarify why connecting would be beneficial
-3. Authenticity - Make it sound more genuine and less generic
-4. Call to action - Ensure there's a clear, low-friction next step
-5. Conciseness - Keep it under 150 words and focused
-6. LinkedIn optimization - Make it specifically tailored for LinkedIn messaging
-7. Goal alignment - Ensure it clearly aligns with the stated networking goal
+# Directory holding each owner's submitted message batches and the messages they produced
+MESSAGE_BATCHES_DIR = os.path.join(DATA_DIR, "batches")
 
-Return ONLY the improved message text without any explanation or commentary about your changes."""
+def load_json_file(path, default):
+    """Load JSON data from a file, or return the default if it does not exist"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+def save_json_file(path, data):
+    """Write JSON data to a file atomically"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_path, path)
+
+def batch_owner():
+    """Return the id this session's batches are stored under, derived from the API key and the browser's owner id"""
+    owner = f"{st.session_state.CLAUDE_API_KEY}\x1f{st.session_state.batch_owner_id}"
+    return hashlib.blake2b(owner.encode("utf-8"), digest_size=16).hexdigest()
+
+def message_batch_files():
+    """Return the current owner's batch list and batch messages files"""
+    owner_dir = os.path.join(MESSAGE_BATCHES_DIR, batch_owner())
+    return os.path.join(owner_dir, "message_batches.json"), os.path.join(owner_dir, "contact_messages.json")
+
+def load_message_batches():
+    """Return the message batches the current owner submitted, oldest first"""
+    return load_json_file(message_batch_files()[0], [])
+
+def load_batch_messages():
+    """Return the current owner's batch messages, one row per contact of each batch"""
+    contact_messages = load_json_file(message_batch_files()[1], {})
+    return [row for batch_messages in contact_messages.values() for row in batch_messages.values()]
+
+def batch_custom_id(contact):
+    """Return the batch request id for a contact"""
+    # Batch custom ids may only contain letters, digits, underscores and hyphens
+    return "contact-" + re.sub(r"[^A-Za-z0-9_-]", "_", str(contact.get("id", "")))[:56]
+
+def submit_message_batch(contacts, template_type="coldOutreach", custom_topic=""):
+    """Submit message generation for many contacts as one Message Batches request"""
+    client = initialize_claude_client()
+    if not client:
+        raise Exception("Claude API key not set")
+    
+    requests = []
+    batch_contacts = {}
+    for contact in contacts:
+        custom_id = batch_custom_id(contact)
+        requests.append({"custom_id": custom_id, "params": build_message_request(contact, template_type, custom_topic)})
+        # Keep the contact details so results can be matched and templated in a later session
+        batch_contacts[custom_id] = {field: contact.get(field) for field in ConnectionStore.FIELDS}
+    
+    batch = client.messages.batches.create(requests=requests)
+    
+    batches_file = message_batch_files()[0]
+    batches = load_json_file(batches_file, [])
+    batches.append({
+        "id": batch.id,
+        "status": batch.processing_status,
+        "submittedAt": datetime.now().isoformat(timespec="seconds"),
+        "messageType": template_type,
+        "customTopic": custom_topic,
+        "contacts": batch_contacts
+    })
+    save_json_file(batches_file, batches)
+    return batch.id
+
+def poll_message_batch(batch_id):
+    """Check one of the current owner's batches and store its messages per contact once it has ended"""
+    client = initialize_claude_client()
+    if not client:
+        raise Exception("Claude API key not set")
+    
+    # Only the owner's own batch list is searched, so other sessions' batches cannot be polled
+    batches_file, messages_file = message_batch_files()
+    batches = load_json_file(batches_file, [])
+    batch_record = next((batch for batch in batches if batch["id"] == batch_id), None)
+    if batch_record is None:
+        raise Exception(f"Unknown message batch {batch_id}")
+    
+    batch = client.messages.batches.retrieve(batch_id)
+    batch_record["status"] = batch.processing_status
+    
+    if batch.processing_status == "ended" and not batch_record.get("collected"):
+        # Custom ids are only unique within a batch, so messages are keyed by batch and then custom id
+        contact_messages = load_json_file(messages_file, {})
+        batch_messages = contact_messages.setdefault(batch_id, {})
+        sender_values = sender_template_values()
+        
+        # Results are streamed one line at a time rather than loaded in full
+        for result in client.messages.batches.results(batch_id):
+            contact = batch_record["contacts"].get(result.custom_id, {})
+            if result.result.type == "succeeded":
+                message = result.result.message.content[0].text
+                source = "Claude AI (batch)"
+            else:
+                message = generate_basic_message(contact, batch_record["messageType"], batch_record.get("customTopic", ""), sender_values)
+                source = "Template (fallback)"
+            
+            batch_messages[result.custom_id] = {
+                "Name": f"{contact.get('firstName', '')} {contact.get('lastName', '')}".strip(),
+                "Company": contact.get("company", ""),
+                "Role": contact.get("role", ""),
+                "Message Type": batch_record["messageType"],
+                "Message": message,
+                "Source": source,
+                "Batch": batch_id
+            }
+        
+        save_json_file(messages_file, contact_messages)
+        batch_record["collected"] = True
+    
+    save_json_file(batches_file, batches)
+    return batch_record
 
-        user_prompt = f"""Improve this LinkedIn networking outreach message to {contact.get('firstName', '')} {contact.get('lastName', '')}, who is a {contact.get('role', 'professional')} at {contact.get('company', 'their company')} in the {contact.get('industry', 'their industry')} industry:
+def render_message_analysis(analysis, title="Message Analysis"):
+    """Display a message analysis with its score, strengths, weaknesses and suggestions"""
+    st.markdown("<div class='divider'></div>", unsafe_allow_html=True)
+    st.markdown(f"### {title}")
+    
+    # Display score
+    score_color = "green"
+    if analysis["overallScore"] < 60:
+        score_color = "red"
+    elif analysis["overallScore"] < 80:
+        score_color = "orange"
+    
+    st.markdown(
+        f"<div style='text-align: center; margin-bottom: 1rem;'>"
+        f"<h2 style='color: {score_color};'>{analysis['overallScore']}/100</h2>"
+        f"<p>{analysis['assessment']}</p>"
+        f"</div>",
+        unsafe_allow_html=True
+    )
+    
+    # Display strengths and weaknesses
+    col_x, col_y = st.columns(2)
+    
+    with col_x:
+        st.markdown("#### Strengths")
+        for strength in analysis["strengths"]:
+            st.markdown(f"✅ {strength}")
+    
+    with col_y:
+        st.markdown("#### Areas for Improvement")
+        if analysis["weaknesses"]:
+            for weakness in analysis["weaknesses"]:
+                st.markdown(f"❌ {weakness}")
+        else:
+            st.markdown("No significant weaknesses identified.")
+    
+    # Display suggestions
+    if analysis["suggestions"]:
+        st.markdown("#### Suggestions")
+        for suggestion in analysis["suggestions"]:
+            st.markdown(f"💡 {suggestion}")
 
-ORIGINAL MESSAGE:
-{message}
+# Choices for the number of recommendation cards per page
+RESULTS_PER_PAGE_OPTIONS = [5, 10, 20, 30]
 
-RECIPIENT DETAILS:
-- Expertise: {contact.get('expertise', 'their expertise')}
-- Seniority: {contact.get('seniority', 'professional')}
-- Connected On: {contact.get('connectedDate', 'some time ago')}
-- Mutual Connections: {contact.get('mutualConnections', 0)}
-"""
+def recommendation_page(search_query=""):
+    """Return the current page of recommendations, or of search results, with its pagination details"""
+    results_per_page = st.session_state.results_per_page
+    if search_query:
+        indices = search_recommendations(search_query)
+        total = len(indices)
+    else:
+        total = len(st.session_state.recommendations)
+    total_pages = max(1, (total + results_per_page - 1) // results_per_page)
+    
+    # Reset page if needed
+    if st.session_state.current_page >= total_pages:
+        st.session_state.current_page = 0
+    
+    start = st.session_state.current_page * results_per_page
+    end = min(start + results_per_page, total)
+    if search_query:
+        recommendations = recommendations_for(indices[start:end])
+    else:
+        recommendations = st.session_state.recommendations[start:end]
+    
+    return {
+        "recommendations": recommendations,
+        "start": start,
+        "end": end,
+        "total": total,
+        "pages": total_pages,
+        "label": "filtered contacts" if search_query else "contacts"
+    }
 
-        user_prompt += f"""
-SENDER DETAILS:
-- Name: {st.session_state.user_profile.get('name', '')}
-- Role/Headline: {st.session_state.user_profile.get('headline', '')}
-- Industry: {st.session_state.user_profile.get('industry', '')}
-- Networking Goal: {st.session_state.networking_goal}
+def change_recommendation_page(step, total_pages):
+    """Move to another page of recommendations, staying within the page count"""
+    st.session_state.current_page = min(max(0, st.session_state.current_page + step), total_pages - 1)
 
-Improve this message while keeping its core intent. Return only the improved message text."""
+def render_pagination(page, key):
+    """Display Previous/Next buttons and the position within the recommendations"""
+    col1, col2, col3 = st.columns([1, 2, 1])
+    
+    # Button callbacks run before the fragment reruns, so the new page is drawn straight away
+    with col1:
+        st.button(
+            "⬅️ Previous", key=f"prev_{key}", disabled=st.session_state.current_page == 0,
+            on_click=change_recommendation_page, args=(-1, page["pages"])
+        )
+    
+    with col2:
+        if page["total"] > 0:
+            st.markdown(f"<div style='text-align: center;'>Page {st.session_state.current_page + 1} of {page['pages']} • Showing {page['start'] + 1}-{page['end']} of {page['total']} {page['label']}</div>", unsafe_allow_html=True)
+        else:
+            st.markdown("<div style='text-align: center;'>No recommendations available</div>", unsafe_allow_html=True)
+    
+    with col3:
+        st.button(
+            "Next ➡️", key=f"next_{key}", disabled=st.session_state.current_page >= page["pages"] - 1,
+            on_click=change_recommendation_page, args=(1, page["pages"])
+        )
 
-        # Send request to Claude
-        with st.spinner("Improving message with Claude AI..."):
-            response = client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=500,
-                system=system_prompt,
-                messages=[
-                    {"role": "user", "content": user_prompt}
-                ]
-            )
-        
-        # Extract the improved message
-        improved_message = response.content[0].text
-        return improved_message
+def recommendation_card_html(contact, is_selected):
+    """Build the HTML for one recommendation card"""
+    first_name = html.escape(contact.get('firstName', ''))
+    last_name = html.escape(contact.get('lastName', ''))
+    role = html.escape(contact.get('role', ''))
+    company = html.escape(contact.get('company', ''))
+    
+    if role and company:
+        headline = f"<strong>{role}</strong> at <strong>{company}</strong>"
+    elif role:
+        headline = f"<strong>{role}</strong>"
+    elif company:
+        headline = f"<strong>Works at {company}</strong>"
+    else:
+        headline = ""
+    
+    # Badges for industry and expertise
+    industry = contact.get('industry', '')
+    expertise = contact.get('expertise', '')
+    
+    badges_html = f"<span class='badge badge-gray'>{html.escape(industry)}</span> " if industry else ""
+    
+    if expertise:
+        expertise_items = expertise.split(',')[0:2] if ',' in expertise else [expertise]
+        for exp in expertise_items:
+            badges_html += f"<span class='badge badge-blue'>{html.escape(exp.strip())}</span> "
+    
+    insights_html = "".join(f"<div>• {html.escape(insight)}</div>" for insight in contact.get('insights') or [])
+    
+    connected_html = ""
+    if contact.get('connectedDate'):
+        connected_html = f"<div style='margin-top: 0.5rem; font-size: 0.8rem; color: #6B7280;'>Connected on: {html.escape(contact.get('connectedDate'))}</div>"
+    
+    return (
+        f"<div class='contact-card {'selected' if is_selected else ''}' id='contact-{html.escape(contact['id'])}'>"
+        f"<div style='display: flex; justify-content: space-between; gap: 1rem;'>"
+        f"<div><h3 style='margin: 0;'>{first_name} {last_name}</h3><div>{headline}</div></div>"
+        f"<div style='text-align: right;'><span class='badge badge-green'>{contact.get('score', 0)}% Match</span>"
+        f"<div><small>{html.escape(contact.get('matchStrength', ''))}</small></div></div>"
+        f"</div>"
+        f"<div style='margin-top: 0.5rem;'>{badges_html}</div>"
+        f"<div style='margin-top: 0.5rem;'>{insights_html}</div>"
+        f"{connected_html}"
+        f"</div>"
+    )
+
+@st.fragment
+def render_recommendation_page(search_query=""):
+    """Display a page of recommendation cards; changing page only reruns this fragment"""
+    # Page size
+    results_per_page = st.selectbox(
+        "Contacts per page",
+        options=RESULTS_PER_PAGE_OPTIONS,
+        index=RESULTS_PER_PAGE_OPTIONS.index(st.session_state.results_per_page) if st.session_state.results_per_page in RESULTS_PER_PAGE_OPTIONS else 0
+    )
+    if results_per_page != st.session_state.results_per_page:
+        st.session_state.results_per_page = results_per_page
+        st.session_state.current_page = 0
     
-    except Exception as e:
-        st.error(f"Error improving message with Claude: {e}")
-        return message
+    page = recommendation_page(search_query)
+    render_pagination(page, "top")
+    
+    current_recommendations = page["recommendations"]
+    if not current_recommendations:
+        st.markdown("<div class='card' style='text-align: center; padding: 2rem;'>", unsafe_allow_html=True)
+        st.markdown("### No Recommendations Available")
+        if search_query:
+            st.markdown(f"No contacts match your search for '{search_query}'. Try a different search term or clear the filter.")
+        else:
+            st.markdown("We couldn't generate any recommendations based on your connections. Try changing your networking goal or refreshing the recommendations.")
+        st.markdown("</div>", unsafe_allow_html=True)
+        return
+    
+    # All cards on the page are drawn as a single element
+    selected_id = st.session_state.selected_contact["id"] if st.session_state.selected_contact else None
+    st.markdown(
+        "".join(recommendation_card_html(contact, contact["id"] == selected_id) for contact in current_recommendations),
+        unsafe_allow_html=True
+    )
+    
+    # Action buttons for the contact chosen on this page
+    col_a, col_b, col_c = st.columns([2, 1, 1])
+    with col_a:
+        page_ids = [contact["id"] for contact in current_recommendations]
+        choice = st.selectbox(
+            "Contact",
+            options=range(len(current_recommendations)),
+            index=page_ids.index(selected_id) if selected_id in page_ids else 0,
+            format_func=lambda i: f"{current_recommendations[i].get('firstName', '')} {current_recommendations[i].get('lastName', '')} • {current_recommendations[i].get('company', '')}",
+            label_visibility="collapsed"
+        )
+    contact = current_recommendations[choice]
+    
+    with col_b:
+        if st.button("View Details", key="view_details"):
+            st.session_state.selected_contact = contact
+            st.rerun()
+    
+    with col_c:
+        if st.button("Create Message", key="create_message"):
+            st.session_state.selected_contact = contact
+            st.session_state.active_tab = "messages"
+            st.rerun()
+    
+    render_pagination(page, "bottom")
 
 # Sidebar for API key setup and navigation
 with st.sidebar:
@@ -1349,6 +3007,40 @@ with st.sidebar:
         )
     
     # Navigation
+    if st.session_state.CLAUDE_API_KEY:
+        response_stats = get_response_cache().stats()
+        st.markdown(
+            f"<small>Response cache: {response_stats['hits']} hits, {response_stats['misses']} misses "
+            f"({response_stats['hitRate']:.0%} hit rate, {response_stats['size']} entries, "
+            f"{response_stats['bytes'] / 1024:.0f} KB)</small>",
+            unsafe_allow_html=True
+        )
+        limiter_stats = get_claude_rate_limiter().stats()
+        st.markdown(
+            f"<small>Rate limiter: {limiter_stats['queued']} queued, {limiter_stats['waited']} of "
+            f"{limiter_stats['admitted']} requests waited (avg {limiter_stats['averageWait']:.1f}s, "
+            f"last {limiter_stats['lastWait']:.1f}s)</small>",
+            unsafe_allow_html=True
+        )
+        breaker_stats = get_claude_circuit_breaker().stats()
+        if breaker_stats["state"] == "open":
+            st.markdown(
+                f"<div class='api-info'>Claude API circuit breaker open after {breaker_stats['failures']} failures. "
+                f"Templates are used until it retries in {breaker_stats['retryIn']:.0f}s.</div>",
+                unsafe_allow_html=True
+            )
+        else:
+            st.markdown(
+                f"<small>Claude API circuit breaker: {breaker_stats['state']} "
+                f"({breaker_stats['failures']} consecutive failures)</small>",
+                unsafe_allow_html=True
+            )
+        if st.session_state.get("analysis_parse_failures"):
+            st.markdown(
+                f"<small>Unreadable message analyses: {st.session_state.analysis_parse_failures}</small>",
+                unsafe_allow_html=True
+            )
+    
     st.markdown("### Navigation")
     
     if st.button("Data Import", key="nav_import"):
@@ -1397,11 +3089,24 @@ with st.sidebar:
     if "custom_goal" not in st.session_state or custom_goal != st.session_state.custom_goal:
         st.session_state.custom_goal = custom_goal
     
-    if goal != st.session_state.networking_goal:
+    # Seeded mode makes rankings depend only on the connections, profile and goals
+    reproducible = st.checkbox(
+        "Reproducible rankings",
+        value=st.session_state.get("scoring_seed") is not None,
+        help="Replace random score jitter and insights with a seeded per-contact hash. Applies to imported activity levels and mutual connections from the next import."
+    )
+    scoring_seed = None
+    if reproducible:
+        scoring_seed = int(st.number_input("Ranking seed", min_value=0, value=st.session_state.get("scoring_seed") or 0, step=1))
+    
+    seed_changed = scoring_seed != st.session_state.get("scoring_seed")
+    st.session_state.scoring_seed = scoring_seed
+    
+    if goal != st.session_state.networking_goal or seed_changed:
         st.session_state.networking_goal = goal
         # Refresh recommendations when goal changes
         if len(st.session_state.linkedin_connections) > 0:
-            st.session_state.recommendations = generate_recommendations(30)  # Generate more recommendations for pagination
+            refresh_recommendations(30)  # Generate more recommendations for pagination
             st.session_state.current_page = 0  # Reset to first page
     
     st.markdown("### About")
@@ -1483,7 +3188,7 @@ if st.session_state.active_tab == "import":
                 st.session_state.connections_uploaded = True
                 
                 # Generate initial recommendations
-                st.session_state.recommendations = generate_recommendations(5)
+                refresh_recommendations(5)
                 
                 st.success(f"Successfully imported {len(connections)} LinkedIn connections")
                 st.rerun()
@@ -1493,6 +3198,12 @@ if st.session_state.active_tab == "import":
         st.markdown("<div class='success-card'>", unsafe_allow_html=True)
         st.markdown(f"✅ **Connections data imported successfully**")
         st.markdown(f"**Total Connections:** {len(st.session_state.linkedin_connections)}")
+        cache_stats = get_classification_cache().stats()
+        st.markdown(
+            f"<small>Classification cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+            f"({cache_stats['hitRate']:.0%} hit rate, {cache_stats['size']} entries)</small>",
+            unsafe_allow_html=True
+        )
         
         if st.button("Re-upload Connections"):
             st.session_state.connections_uploaded = False
@@ -1558,10 +3269,7 @@ elif st.session_state.active_tab == "profile":
     
     with col2:
         # Count connections by industry
-        industries = {}
-        for connection in st.session_state.linkedin_connections:
-            industry = connection.get("industry", "Unknown")
-            industries[industry] = industries.get(industry, 0) + 1
+        industries = st.session_state.linkedin_connections.value_counts("industry") if st.session_state.linkedin_connections else {}
         
         # Get the most common industry
         most_common_industry = max(industries.items(), key=lambda x: x[1]) if industries else ("None", 0)
@@ -1636,205 +3344,136 @@ elif st.session_state.active_tab == "recommendations":
     
     # Refresh recommendations if needed
     if not st.session_state.recommendations:
-        st.session_state.recommendations = generate_recommendations(30)  # Generate more recommendations for pagination
+        refresh_recommendations(30)  # Generate more recommendations for pagination
     
     # Display refresh button
     if st.button("Refresh Recommendations"):
         with st.spinner("Generating fresh recommendations..."):
-            time.sleep(1)  # Simulate processing time
-            st.session_state.recommendations = generate_recommendations(30)
+            refresh_recommendations(30)
             st.session_state.current_page = 0  # Reset to first page
     
+    # Measured time of each stage of the last refresh
+    refresh_timings = st.session_state.get("refresh_timings")
+    if refresh_timings:
+        with st.expander("Refresh timings"):
+            if refresh_timings.get("skipped"):
+                st.markdown("Skipped: goal, profile and connections are unchanged since the last ranking.")
+            else:
+                st.table(pd.DataFrame(
+                    [{"Stage": stage, "Time (ms)": round(seconds * 1000, 2)} for stage, seconds in refresh_timings.items()]
+                ))
+    
     # Pagination setup
     if "current_page" not in st.session_state:
         st.session_state.current_page = 0
     
-    results_per_page = st.session_state.results_per_page
-    
-    # Determine total number of pages
-    total_recommendations = len(st.session_state.recommendations)
-    total_pages = max(1, (total_recommendations + results_per_page - 1) // results_per_page)
-    
-    # Filter recommendations for current page
-    start_idx = st.session_state.current_page * results_per_page
-    end_idx = min(start_idx + results_per_page, total_recommendations)
-    
-    current_recommendations = st.session_state.recommendations[start_idx:end_idx] if st.session_state.recommendations else []
-    
-    # Add pagination controls at the top
-    col1, col2, col3 = st.columns([1, 2, 1])
-    
-    with col1:
-        if st.button("⬅️ Previous", disabled=st.session_state.current_page == 0):
-            st.session_state.current_page = max(0, st.session_state.current_page - 1)
-            st.rerun()
-    
-    with col2:
-        if total_recommendations > 0:
-            st.markdown(f"<div style='text-align: center;'>Page {st.session_state.current_page + 1} of {total_pages} • Showing {start_idx + 1}-{end_idx} of {total_recommendations} contacts</div>", unsafe_allow_html=True)
-        else:
-            st.markdown("<div style='text-align: center;'>No recommendations available</div>", unsafe_allow_html=True)
-    
-    with col3:
-        if st.button("Next ➡️", disabled=st.session_state.current_page >= total_pages - 1):
-            st.session_state.current_page = min(total_pages - 1, st.session_state.current_page + 1)
-            st.rerun()
-    
     # Filter and search
     st.markdown("<div style='padding: 10px 0px;'>", unsafe_allow_html=True)
     search_query = st.text_input("Filter contacts by name, company, role, or expertise:", 
                                  placeholder="Enter keywords to filter results")
     st.markdown("</div>", unsafe_allow_html=True)
     
-    # Filter recommendations if search query provided
+    # Current page of recommendations, or of the whole network's search results
+    current_page = recommendation_page(search_query)
+    current_recommendations = current_page["recommendations"]
+    
+    # Show filter result stats
     if search_query:
-        filtered_recommendations = []
-        for rec in st.session_state.recommendations:
-            searchable_text = " ".join([
-                str(rec.get("firstName", "")),
-                str(rec.get("lastName", "")),
-                str(rec.get("company", "")),
-                str(rec.get("role", "")),
-                str(rec.get("expertise", "")),
-                str(rec.get("industry", ""))
-            ]).lower()
-            
-            if search_query.lower() in searchable_text:
-                filtered_recommendations.append(rec)
+        st.markdown(f"<div style='padding: 5px 0px;'><i>Found {current_page['total']} contacts matching '{search_query}'</i></div>", unsafe_allow_html=True)
+    
+    # Bulk message generation
+    with st.expander("Bulk Message Generation"):
+        st.markdown("Write messages for many recommended contacts at once and export them as CSV.")
         
-        # Update pagination for filtered results
-        total_filtered = len(filtered_recommendations)
-        total_filtered_pages = max(1, (total_filtered + results_per_page - 1) // results_per_page)
+        col_a, col_b, col_c = st.columns(3)
+        with col_a:
+            bulk_scope = st.radio("Contacts", options=["Current page", "All recommendations"], key="bulk_scope")
+        with col_b:
+            bulk_message_type = st.selectbox(
+                "Message Type",
+                options=["coldOutreach", "followUp", "informationalInterview"],
+                format_func=lambda x: {
+                    "coldOutreach": "Cold Outreach",
+                    "followUp": "Follow-Up",
+                    "informationalInterview": "Informational Interview"
+                }.get(x, x),
+                key="bulk_message_type"
+            )
+        with col_c:
+            bulk_concurrency = st.slider("Concurrent requests", min_value=1, max_value=20, value=BULK_CONCURRENCY, key="bulk_concurrency")
+        
+        bulk_table = st.empty()
+        if st.button("Generate Messages", key="bulk_generate", type="primary"):
+            bulk_contacts = current_recommendations if bulk_scope == "Current page" else st.session_state.recommendations
+            
+            with st.spinner(f"Generating {len(bulk_contacts)} messages..."):
+                st.session_state.bulk_messages = generate_bulk_messages(
+                    list(bulk_contacts),
+                    bulk_message_type,
+                    st.session_state.custom_topic,
+                    concurrency=bulk_concurrency,
+                    on_result=lambda rows: bulk_table.dataframe(pd.DataFrame(rows), use_container_width=True)
+                )
         
-        # Reset page if needed
-        if st.session_state.current_page >= total_filtered_pages:
-            st.session_state.current_page = 0
+        if st.session_state.get("bulk_messages"):
+            bulk_messages = pd.DataFrame(st.session_state.bulk_messages)
+            bulk_table.dataframe(bulk_messages, use_container_width=True)
+            st.download_button(
+                "Download Messages CSV",
+                data=bulk_messages.to_csv(index=False).encode("utf-8"),
+                file_name="linkedin_messages.csv",
+                mime="text/csv",
+                key="bulk_download"
+            )
         
-        # Get current page of filtered results
-        filtered_start = st.session_state.current_page * results_per_page
-        filtered_end = min(filtered_start + results_per_page, total_filtered)
+        # Overnight batch mode
+        st.markdown("#### Overnight Batch")
+        st.markdown("For large campaigns, submit the messages as a Message Batch. Results usually arrive within a few hours at lower cost.")
         
-        current_recommendations = filtered_recommendations[filtered_start:filtered_end]
+        if st.button("Submit as Overnight Batch", key="batch_submit"):
+            if not st.session_state.CLAUDE_API_KEY:
+                st.error("Claude API key not set. Please configure it in the sidebar.")
+            else:
+                batch_contacts = current_recommendations if bulk_scope == "Current page" else st.session_state.recommendations
+                try:
+                    batch_id = submit_message_batch(list(batch_contacts), bulk_message_type, st.session_state.custom_topic)
+                    st.success(f"Submitted batch {batch_id} for {len(batch_contacts)} contacts")
+                except Exception as e:
+                    st.error(f"Error submitting message batch: {e}")
         
-        # Show filter result stats
-        st.markdown(f"<div style='padding: 5px 0px;'><i>Found {total_filtered} contacts matching '{search_query}'</i></div>", unsafe_allow_html=True)
+        for batch_record in reversed(load_message_batches()):
+            col_a, col_b = st.columns([3, 1])
+            with col_a:
+                st.markdown(
+                    f"**{batch_record['id']}** • {len(batch_record['contacts'])} contacts • "
+                    f"submitted {batch_record['submittedAt']} • {batch_record['status']}"
+                )
+            with col_b:
+                if not batch_record.get("collected") and st.button("Check Status", key=f"batch_poll_{batch_record['id']}"):
+                    try:
+                        poll_message_batch(batch_record["id"])
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"Error checking message batch: {e}")
+        
+        batch_message_rows = load_batch_messages()
+        if batch_message_rows:
+            batch_messages = pd.DataFrame(batch_message_rows)
+            st.dataframe(batch_messages, use_container_width=True)
+            st.download_button(
+                "Download Batch Messages CSV",
+                data=batch_messages.to_csv(index=False).encode("utf-8"),
+                file_name="linkedin_batch_messages.csv",
+                mime="text/csv",
+                key="batch_download"
+            )
     
     # Create a two-column layout
     col1, col2 = st.columns([2, 1])
     
     with col1:
         # Display recommendations
-        if not current_recommendations:
-            st.markdown("<div class='card' style='text-align: center; padding: 2rem;'>", unsafe_allow_html=True)
-            st.markdown("### No Recommendations Available")
-            if search_query:
-                st.markdown(f"No contacts match your search for '{search_query}'. Try a different search term or clear the filter.")
-            else:
-                st.markdown("We couldn't generate any recommendations based on your connections. Try changing your networking goal or refreshing the recommendations.")
-            st.markdown("</div>", unsafe_allow_html=True)
-        else:
-            for i, contact in enumerate(current_recommendations):
-                is_selected = st.session_state.selected_contact and st.session_state.selected_contact["id"] == contact["id"]
-                
-                st.markdown(
-                    f"<div class='contact-card {'' if not is_selected else 'selected'}' id='contact-{contact['id']}'>",
-                    unsafe_allow_html=True
-                )
-                
-                # Contact header with score
-                col_a, col_b = st.columns([3, 1])
-                with col_a:
-                    st.markdown(f"### {contact.get('firstName', '')} {contact.get('lastName', '')}")
-                    if contact.get('role') and contact.get('company'):
-                        st.markdown(f"**{contact.get('role', '')}** at **{contact.get('company', '')}**")
-                    elif contact.get('role'):
-                        st.markdown(f"**{contact.get('role', '')}**")
-                    elif contact.get('company'):
-                        st.markdown(f"**Works at {contact.get('company', '')}**")
-                
-                with col_b:
-                    st.markdown(
-                        f"<div style='text-align: right;'><span class='badge badge-green'>{contact.get('score', 0)}% Match</span></div>",
-                        unsafe_allow_html=True
-                    )
-                    st.markdown(
-                        f"<div style='text-align: right;'><small>{contact.get('matchStrength', '')}</small></div>",
-                        unsafe_allow_html=True
-                    )
-                
-                # Contact details and insights
-                st.markdown("<div style='margin-top: 0.5rem;'>", unsafe_allow_html=True)
-                
-                # Display badges for industry and expertise
-                industry = contact.get('industry', '')
-                expertise = contact.get('expertise', '')
-                
-                badges_html = f"<span class='badge badge-gray'>{industry}</span> " if industry else ""
-                
-                if expertise:
-                    expertise_items = expertise.split(',')[0:2] if ',' in expertise else [expertise]
-                    for exp in expertise_items:
-                        badges_html += f"<span class='badge badge-blue'>{exp.strip()}</span> "
-                
-                if badges_html:
-                    st.markdown(f"<div>{badges_html}</div>", unsafe_allow_html=True)
-                
-                # Display insights
-                if contact.get('insights'):
-                    st.markdown("<div style='margin-top: 0.5rem;'>", unsafe_allow_html=True)
-                    for insight in contact.get('insights', []):
-                        st.markdown(f"• {insight}")
-                    st.markdown("</div>", unsafe_allow_html=True)
-                
-                # Display connected date
-                if contact.get('connectedDate'):
-                    st.markdown(f"<div style='margin-top: 0.5rem; font-size: 0.8rem; color: #6B7280;'>Connected on: {contact.get('connectedDate')}</div>", unsafe_allow_html=True)
-                
-                st.markdown("</div>", unsafe_allow_html=True)
-                
-                # Action buttons
-                col_a, col_b = st.columns([1, 1])
-                with col_a:
-                    view_button = st.button("View Details", key=f"view_{contact['id']}")
-                    if view_button:
-                        st.session_state.selected_contact = contact
-                
-                with col_b:
-                    message_button = st.button("Create Message", key=f"message_{contact['id']}")
-                    if message_button:
-                        st.session_state.selected_contact = contact
-                        st.session_state.active_tab = "messages"
-                        st.rerun()
-                
-                st.markdown("</div>", unsafe_allow_html=True)
-            
-            # Add pagination controls at the bottom
-            st.markdown("<div style='padding: 15px 0px;'>", unsafe_allow_html=True)
-            col1, col2, col3 = st.columns([1, 2, 1])
-            
-            with col1:
-                if st.button("⬅️ Previous", key="prev_bottom", disabled=st.session_state.current_page == 0):
-                    st.session_state.current_page = max(0, st.session_state.current_page - 1)
-                    st.rerun()
-            
-            with col2:
-                if search_query:
-                    current_page_count = len(current_recommendations)
-                    st.markdown(f"<div style='text-align: center;'>Page {st.session_state.current_page + 1} of {total_filtered_pages} • Showing {filtered_start + 1}-{filtered_start + current_page_count} of {total_filtered} filtered contacts</div>", unsafe_allow_html=True)
-                else:
-                    st.markdown(f"<div style='text-align: center;'>Page {st.session_state.current_page + 1} of {total_pages} • Showing {start_idx + 1}-{end_idx} of {total_recommendations} contacts</div>", unsafe_allow_html=True)
-            
-            with col3:
-                if search_query:
-                    if st.button("Next ➡️", key="next_bottom", disabled=st.session_state.current_page >= total_filtered_pages - 1):
-                        st.session_state.current_page = min(total_filtered_pages - 1, st.session_state.current_page + 1)
-                        st.rerun()
-                else:
-                    if st.button("Next ➡️", key="next_bottom", disabled=st.session_state.current_page >= total_pages - 1):
-                        st.session_state.current_page = min(total_pages - 1, st.session_state.current_page + 1)
-                        st.rerun()
-            
-            st.markdown("</div>", unsafe_allow_html=True)
+        render_recommendation_page(search_query)
     
     with col2:
         # Display selected contact detail
@@ -1986,19 +3625,22 @@ elif st.session_state.active_tab == "messages":
             
             with col_b:
                 ai_gen = st.button("Generate with Claude AI", type="primary")
-                if ai_gen:
-                    # Check if Claude API key is set
-                    if not st.session_state.CLAUDE_API_KEY:
-                        st.error("Claude API key not set. Please configure it in the sidebar.")
-                    else:
-                        st.session_state.generated_message = generate_claude_message(
-                            contact, 
-                            st.session_state.message_type,
-                            st.session_state.custom_topic
-                        )
+                # Check if Claude API key is set
+                if ai_gen and not st.session_state.CLAUDE_API_KEY:
+                    st.error("Claude API key not set. Please configure it in the sidebar.")
             
             # Message text area
             st.markdown("### Your LinkedIn Message")
+            
+            # Stream the Claude message into the message area, then show it in the editor
+            if ai_gen and st.session_state.CLAUDE_API_KEY:
+                st.session_state.generated_message = generate_claude_message(
+                    contact, 
+                    st.session_state.message_type,
+                    st.session_state.custom_topic,
+                    stream=True
+                )
+            
             message = st.text_area(
                 "Edit your message",
                 value=st.session_state.generated_message,
@@ -2011,7 +3653,7 @@ elif st.session_state.active_tab == "messages":
                 st.session_state.generated_message = message
             
             # Analyze and improve buttons
-            col_a, col_b = st.columns(2)
+            col_a, col_b, col_c = st.columns(3)
             
             with col_a:
                 analyze = st.button("Analyze Message")
@@ -2021,45 +3663,8 @@ elif st.session_state.active_tab == "messages":
                         contact
                     )
                     
-                    st.markdown("<div class='divider'></div>", unsafe_allow_html=True)
-                    st.markdown("### Message Analysis")
-                    
-                    # Display score
-                    score_color = "green"
-                    if analysis["overallScore"] < 60:
-                        score_color = "red"
-                    elif analysis["overallScore"] < 80:
-                        score_color = "orange"
-                    
-                    st.markdown(
-                        f"<div style='text-align: center; margin-bottom: 1rem;'>"
-                        f"<h2 style='color: {score_color};'>{analysis['overallScore']}/100</h2>"
-                        f"<p>{analysis['assessment']}</p>"
-                        f"</div>",
-                        unsafe_allow_html=True
-                    )
-                    
-                    # Display strengths and weaknesses
-                    col_x, col_y = st.columns(2)
-                    
-                    with col_x:
-                        st.markdown("#### Strengths")
-                        for strength in analysis["strengths"]:
-                            st.markdown(f"✅ {strength}")
-                    
-                    with col_y:
-                        st.markdown("#### Areas for Improvement")
-                        if analysis["weaknesses"]:
-                            for weakness in analysis["weaknesses"]:
-                                st.markdown(f"❌ {weakness}")
-                        else:
-                            st.markdown("No significant weaknesses identified.")
-                    
-                    # Display suggestions
-                    if analysis["suggestions"]:
-                        st.markdown("#### Suggestions")
-                        for suggestion in analysis["suggestions"]:
-                            st.markdown(f"💡 {suggestion}")
+                    if analysis:
+                        render_message_analysis(analysis)
             
             with col_b:
                 improve = st.button("Improve with Claude AI")
@@ -2078,6 +3683,31 @@ elif st.session_state.active_tab == "messages":
                             st.success("Message improved successfully!")
                             st.rerun()
             
+            with col_c:
+                analyze_and_improve = st.button("Analyze & Improve")
+                if analyze_and_improve and st.session_state.generated_message:
+                    # Check if Claude API key is set
+                    if not st.session_state.CLAUDE_API_KEY:
+                        st.error("Claude API key not set. Please configure it in the sidebar.")
+                    else:
+                        analysis, improved_message = analyze_and_improve_message_with_claude(
+                            st.session_state.generated_message,
+                            contact
+                        )
+                        
+                        # Keep the analysis to show it after the rerun that loads the improved message
+                        if analysis:
+                            st.session_state.original_message_analysis = analysis
+                        if improved_message != st.session_state.generated_message:
+                            st.session_state.generated_message = improved_message
+                            st.rerun()
+            
+            if "original_message_analysis" in st.session_state:
+                render_message_analysis(
+                    st.session_state.pop("original_message_analysis"),
+                    title="Analysis of Your Original Message"
+                )
+            
             # LinkedIn send simulation
             if st.session_state.generated_message:
                 st.markdown("<div class='divider'></div>", unsafe_allow_html=True)
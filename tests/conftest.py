@@ -0,0 +1,192 @@
+import importlib.util
+import json
+import logging
+import os
+import pathlib
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+APP_PATH = pathlib.Path(__file__).resolve().parent.parent / "app.py"
+
+
+def claude_message(text="Hello from the fake Claude API", tool_name=None, tool_input=None):
+    """Build a Messages API response body with a text block, or a tool_use block when tool_name is given"""
+    if tool_name:
+        content = [{"type": "tool_use", "id": "toolu_1", "name": tool_name, "input": tool_input}]
+    else:
+        content = [{"type": "text", "text": text}]
+    return {
+        "id": "msg_1", "type": "message", "role": "assistant", "model": "claude-3-haiku-20240307",
+        "content": content, "stop_reason": "end_turn", "stop_sequence": None,
+        "usage": {"input_tokens": 10, "output_tokens": 20},
+    }
+
+
+class FakeClaude:
+    """A local stand-in for the Claude API that records requests and fails them on demand"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = []
+        # Each queued failure is (status code, headers) and answers one request
+        self.failures = []
+        self.respond = lambda body: claude_message()
+        # Streamed responses send this many words, then an overloaded error event; None streams them all
+        self.stream_words_before_error = None
+        # Submitted message batches by id; each has ended by the time it is first retrieved
+        self.batches = {}
+
+    def fail(self, status, count=1, headers=None):
+        self.failures.extend([(status, headers or {})] * count)
+
+    def next_failure(self, body):
+        with self.lock:
+            self.requests.append(body)
+            return self.failures.pop(0) if self.failures else None
+
+
+class FakeClaudeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, data, content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("content-type", content_type)
+        self.send_header("content-length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        fake = self.server.fake
+        body = json.loads(self.rfile.read(int(self.headers["content-length"])))
+        if self.path.startswith("/v1/messages/batches"):
+            batch_id = f"msgbatch_{len(fake.batches) + 1}"
+            fake.batches[batch_id] = body["requests"]
+            return self.reply(200, json.dumps(message_batch(batch_id, "in_progress")).encode())
+        failure = fake.next_failure(body)
+        if failure:
+            status, headers = failure
+            error = {"type": "error", "error": {"type": "rate_limit_error" if status == 429 else "api_error", "message": "fake failure"}}
+            return self.reply(status, json.dumps(error).encode(), headers=headers)
+        message = fake.respond(body)
+        if body.get("stream"):
+            return self.reply(200, stream_events(message, fake.stream_words_before_error), content_type="text/event-stream")
+        self.reply(200, json.dumps(message).encode())
+
+    def do_GET(self):
+        fake = self.server.fake
+        batch_id = self.path.split("?")[0].split("/")[4]
+        if not self.path.split("?")[0].endswith("/results"):
+            return self.reply(200, json.dumps(message_batch(batch_id, "ended")).encode())
+        lines = [
+            json.dumps({"custom_id": request["custom_id"], "result": {"type": "succeeded", "message": claude_message(f"Batch {batch_id} message for {request['custom_id']}")}})
+            for request in fake.batches[batch_id]
+        ]
+        self.reply(200, "\n".join(lines).encode(), content_type="application/binary")
+
+
+def message_batch(batch_id, status):
+    """Build a Message Batches API batch object"""
+    return {
+        "id": batch_id, "type": "message_batch", "processing_status": status,
+        "request_counts": {"processing": 0, "succeeded": 0, "errored": 0, "canceled": 0, "expired": 0},
+        "created_at": "2024-01-01T00:00:00Z", "expires_at": "2024-01-02T00:00:00Z", "ended_at": None,
+        "archived_at": None, "cancel_initiated_at": None,
+        "results_url": f"/v1/messages/batches/{batch_id}/results" if status == "ended" else None,
+    }
+
+
+def stream_events(message, words_before_error=None):
+    """Encode a text message as the server-sent events of a streamed response, optionally failing partway"""
+    words = re.findall(r"\S+\s*", message["content"][0]["text"])
+    start = dict(message, content=[])
+    events = [
+        ("message_start", {"type": "message_start", "message": start}),
+        ("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}),
+    ]
+    events += [
+        ("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": word}})
+        for word in words[:words_before_error]
+    ]
+    if words_before_error is not None:
+        events.append(("error", {"type": "error", "error": {"type": "overloaded_error", "message": "fake failure"}}))
+    events += [
+        ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+        ("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": 5}}),
+        ("message_stop", {"type": "message_stop"}),
+    ]
+    return "".join(f"event: {name}\ndata: {json.dumps(data)}\n\n" for name, data in events).encode()
+
+
+@pytest.fixture(scope="session")
+def fake_claude_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeClaudeHandler)
+    server.fake = FakeClaude()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture(scope="session")
+def app(fake_claude_server, tmp_path_factory):
+    """Load app.py the way `streamlit run` would, pointed at the fake Claude API and a throwaway data directory"""
+    os.environ["CLAUDE_BASE_URL"] = f"http://127.0.0.1:{fake_claude_server.server_address[1]}"
+    os.environ["OUTREACH_DATA_DIR"] = str(tmp_path_factory.mktemp("outreach"))
+    spec = importlib.util.spec_from_file_location("app", APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    # Outside `streamlit run` every st call warns about the missing script context
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+    return module
+
+
+@pytest.fixture
+def fake_claude(fake_claude_server):
+    fake_claude_server.fake.reset()
+    return fake_claude_server.fake
+
+
+@pytest.fixture
+def session(app):
+    """Reset the session state the Claude helpers read"""
+    state = app.st.session_state
+    state.CLAUDE_API_KEY = "test-key"
+    state.user_profile = {"name": "Alex Doe", "headline": "Data Lead", "industry": "Finance", "summary": "Builds data teams."}
+    state.networking_goal = "Find a mentor"
+    state.custom_goal = ""
+    state.use_claude = True
+    return state
+
+
+@pytest.fixture
+def contacts():
+    return [
+        {
+            "id": str(i), "name": f"Person {i}", "firstName": "Person", "lastName": str(i), "role": "CTO",
+            "position": "CTO", "company": "Acme", "industry": "Technology", "expertise": "Leadership",
+            "location": "New York", "seniority": "Executive",
+        }
+        for i in range(30)
+    ]
+
+
+@pytest.fixture
+def breaker(app, monkeypatch):
+    """Give each test its own circuit breaker and a rate limiter that never makes it wait"""
+    breaker = app.CircuitBreaker()
+    limiter = app.ClaudeRateLimiter(10**6, 10**9, 10**9)
+    monkeypatch.setattr(app, "get_claude_circuit_breaker", lambda: breaker)
+    monkeypatch.setattr(app, "get_claude_rate_limiter", lambda: limiter)
+    return breaker
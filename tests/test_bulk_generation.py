@@ -0,0 +1,53 @@
+import re
+import threading
+import time
+
+from conftest import claude_message
+
+
+class InFlight:
+    """Answers each request after a short delay, echoing the recipient, and records peak concurrency"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = 0
+        self.peak = 0
+
+    def __call__(self, body):
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+        time.sleep(0.05)
+        with self.lock:
+            self.current -= 1
+        recipient = re.search(r"Person \d+\b", body["messages"][0]["content"]).group()
+        return claude_message(f"Message for {recipient}")
+
+
+def test_bulk_requests_run_concurrently_and_keep_contact_order(app, session, fake_claude, breaker, contacts, monkeypatch):
+    monkeypatch.setattr(app, "claude_retry_delay", lambda error, attempt: 0.0)
+    fake_claude.respond = in_flight = InFlight()
+    fake_claude.fail(503, count=2)
+    fake_claude.fail(429, headers={"retry-after": "0"})
+    updates = []
+
+    results = app.generate_bulk_messages(contacts[:12], concurrency=4, on_result=lambda partial: updates.append(len(partial)))
+
+    assert [result["Message"] for result in results] == [f"Message for {contact['name']}" for contact in contacts[:12]]
+    assert all(result["Source"] == "Claude AI" for result in results)
+    # The three failed attempts were retried within their calls
+    assert len(fake_claude.requests) == 12 + 3
+    assert 1 < in_flight.peak <= 4
+    assert updates == list(range(1, 13))
+    assert breaker.stats()["state"] == "closed"
+
+
+def test_bulk_call_with_client_error_falls_back_alone(app, session, fake_claude, breaker, contacts, monkeypatch):
+    monkeypatch.setattr(app, "claude_retry_delay", lambda error, attempt: 0.0)
+    fake_claude.respond = InFlight()
+    fake_claude.fail(400)
+
+    results = app.generate_bulk_messages(contacts[:6], concurrency=1)
+
+    assert [result["Source"] for result in results] == ["Template (fallback)"] + ["Claude AI"] * 5
+    assert results[1]["Message"] == "Message for Person 1"
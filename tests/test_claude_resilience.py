@@ -0,0 +1,166 @@
+import pytest
+
+from conftest import claude_message
+
+CLAUDE_TEXT = claude_message()["content"][0]["text"]
+
+
+@pytest.fixture
+def no_backoff(app, monkeypatch):
+    monkeypatch.setattr(app, "claude_retry_delay", lambda error, attempt: 0.0)
+
+
+def test_rate_limited_bulk_run_retries_without_opening_breaker(app, session, fake_claude, breaker, contacts):
+    fake_claude.fail(429, count=5, headers={"retry-after": "0"})
+
+    results = app.generate_bulk_messages(contacts)
+
+    assert [result["Source"] for result in results] == ["Claude AI"] * len(contacts)
+    assert len(fake_claude.requests) == len(contacts) + 5
+    assert breaker.stats()["state"] == "closed"
+
+
+def test_overloaded_errors_with_retry_after_open_breaker(app, session, fake_claude, breaker, contacts, no_backoff):
+    attempts = app.CLAUDE_MAX_RETRIES + 1
+    fake_claude.fail(529, count=attempts * app.CIRCUIT_FAILURE_THRESHOLD, headers={"retry-after": "0"})
+
+    for contact in contacts[:app.CIRCUIT_FAILURE_THRESHOLD]:
+        assert app.generate_claude_message(contact) != CLAUDE_TEXT
+
+    assert len(fake_claude.requests) == attempts * app.CIRCUIT_FAILURE_THRESHOLD
+    assert breaker.stats()["state"] == "open"
+
+
+def test_exhausted_rate_limit_leaves_failures_alone(app, session, fake_claude, breaker, contacts, no_backoff):
+    attempts = app.CLAUDE_MAX_RETRIES + 1
+    fake_claude.fail(500, count=attempts * 2)
+    fake_claude.fail(429, count=attempts, headers={"retry-after": "0"})
+    fake_claude.fail(500, count=attempts * (app.CIRCUIT_FAILURE_THRESHOLD - 2))
+
+    for contact in contacts[:app.CIRCUIT_FAILURE_THRESHOLD + 1]:
+        app.generate_claude_message(contact)
+
+    # The rate-limited call in the middle neither counted nor reset the run of outages
+    assert breaker.stats()["failures"] == app.CIRCUIT_FAILURE_THRESHOLD
+    assert breaker.stats()["state"] == "open"
+
+
+def test_server_errors_count_once_per_call(app, session, fake_claude, breaker, contacts, no_backoff):
+    attempts = app.CLAUDE_MAX_RETRIES + 1
+    fake_claude.fail(500, count=attempts * app.CIRCUIT_FAILURE_THRESHOLD)
+
+    for calls, contact in enumerate(contacts[:app.CIRCUIT_FAILURE_THRESHOLD - 1], start=1):
+        app.generate_claude_message(contact)
+        assert breaker.stats()["failures"] == calls
+        assert breaker.stats()["state"] == "closed"
+
+    app.generate_claude_message(contacts[app.CIRCUIT_FAILURE_THRESHOLD - 1])
+    assert breaker.stats()["state"] == "open"
+    assert len(fake_claude.requests) == attempts * app.CIRCUIT_FAILURE_THRESHOLD
+
+    # An open breaker falls back without calling the API
+    app.generate_claude_message(contacts[-1])
+    assert len(fake_claude.requests) == attempts * app.CIRCUIT_FAILURE_THRESHOLD
+
+
+def test_successful_retry_resets_failures(app, session, fake_claude, breaker, contacts, no_backoff):
+    fake_claude.fail(500, count=app.CLAUDE_MAX_RETRIES + 1)
+    app.generate_claude_message(contacts[0])
+    assert breaker.stats()["failures"] == 1
+
+    fake_claude.fail(503)
+    assert app.generate_claude_message(contacts[1]) == CLAUDE_TEXT
+    assert breaker.stats() == {"state": "closed", "failures": 0, "retryIn": 0.0}
+
+
+def half_open(app, breaker):
+    """Open the breaker and let its cool-down pass, so the next call is the probe"""
+    breaker.failures = app.CIRCUIT_FAILURE_THRESHOLD
+    breaker.state = "open"
+    breaker.opened_at = app.time.monotonic() - breaker.reset_seconds
+
+
+class ScriptInterrupted(BaseException):
+    """Stands in for the exception Streamlit raises to stop a script run"""
+
+
+class InterruptedPlaceholder:
+    def write_stream(self, stream):
+        next(iter(stream))
+        raise ScriptInterrupted()
+
+    def empty(self):
+        pass
+
+
+def test_interrupted_stream_probe_releases_breaker(app, session, fake_claude, breaker, contacts, monkeypatch):
+    half_open(app, breaker)
+    with monkeypatch.context() as patch:
+        patch.setattr(app.st, "empty", InterruptedPlaceholder)
+        with pytest.raises(ScriptInterrupted):
+            app.generate_claude_message(contacts[0], stream=True)
+    assert breaker.stats()["state"] == "open"
+
+    assert app.generate_claude_message(contacts[1]) == CLAUDE_TEXT
+    assert breaker.stats()["state"] == "closed"
+
+
+def test_unanswered_probe_expires(app, breaker):
+    breaker.probe_timeout = 0.05
+    half_open(app, breaker)
+
+    assert breaker.allow()
+    assert not breaker.allow()
+    app.time.sleep(0.1)
+    # The first probe never reported back, so another is let through
+    assert breaker.allow()
+    assert breaker.stats()["state"] == "half-open"
+
+
+class RecordingPlaceholder:
+    def __init__(self):
+        self.text = ""
+
+    def write_stream(self, stream):
+        for chunk in stream:
+            self.text += chunk
+        return self.text
+
+    def empty(self):
+        self.text = ""
+
+
+def test_stream_failing_partway_is_cleared(app, session, fake_claude, breaker, contacts, monkeypatch):
+    placeholder = RecordingPlaceholder()
+    monkeypatch.setattr(app.st, "empty", lambda: placeholder)
+    fake_claude.stream_words_before_error = 2
+
+    message = app.generate_claude_message(contacts[0], stream=True)
+
+    assert message != CLAUDE_TEXT
+    assert placeholder.text == ""
+
+
+def test_failed_stream_is_not_retried(app, session, fake_claude, breaker, contacts, monkeypatch):
+    monkeypatch.setattr(app.st, "empty", RecordingPlaceholder)
+    fake_claude.fail(503)
+
+    assert app.generate_claude_message(contacts[0], stream=True) != CLAUDE_TEXT
+    assert len(fake_claude.requests) == 1
+
+
+def test_streamed_message_is_returned_and_cleared(app, session, fake_claude, breaker, contacts, monkeypatch):
+    placeholder = RecordingPlaceholder()
+    monkeypatch.setattr(app.st, "empty", lambda: placeholder)
+
+    assert app.generate_claude_message(contacts[0], stream=True) == CLAUDE_TEXT
+    assert placeholder.text == ""
+
+
+def test_rate_limited_probe_lets_next_call_probe(app, session, fake_claude, breaker, contacts, no_backoff):
+    half_open(app, breaker)
+    fake_claude.fail(429, count=app.CLAUDE_MAX_RETRIES + 1, headers={"retry-after": "0"})
+
+    assert app.generate_claude_message(contacts[0]) != CLAUDE_TEXT
+    assert app.generate_claude_message(contacts[1]) == CLAUDE_TEXT
+    assert breaker.stats()["state"] == "closed"
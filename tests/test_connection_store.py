@@ -0,0 +1,79 @@
+import pytest
+
+
+def connection_fields(app, ids):
+    """Build the field lists ConnectionStore.extend takes for connections with the given ids"""
+    fields = {field: [f"{field} {i}" for i in ids] for field in app.ConnectionStore.FIELDS}
+    fields["id"] = [str(i) for i in ids]
+    fields["mutualConnections"] = [i % 50 for i in ids]
+    fields["industry"] = ["Technology" if i % 2 else "Finance" for i in ids]
+    fields["expertise"] = ["Leadership"] * len(ids)
+    fields["seniority"] = ["Executive"] * len(ids)
+    fields["companySize"] = ["Large"] * len(ids)
+    fields["activityLevel"] = ["High"] * len(ids)
+    return fields
+
+
+@pytest.fixture
+def store(app):
+    store = app.ConnectionStore()
+    store.extend(connection_fields(app, range(10)))
+    return store
+
+
+def test_fingerprint_changes_when_connections_are_added(app, store):
+    before = store.fingerprint()
+    assert store.fingerprint() == before
+
+    store.extend(connection_fields(app, range(10, 12)))
+
+    assert store.fingerprint() != before
+    rebuilt = app.ConnectionStore()
+    rebuilt.extend(connection_fields(app, range(12)))
+    assert store.fingerprint() == rebuilt.fingerprint()
+
+
+def test_search_matches_every_term_by_prefix(app, store):
+    assert store.search_index.search("company 3").tolist() == [3]
+    assert sorted(store.search_index.search("fin").tolist()) == [0, 2, 4, 6, 8]
+    assert store.search_index.search("fin rol 5").tolist() == []
+    assert store.search_index.search("  ").tolist() == []
+
+
+def test_search_sees_connections_added_after_first_search(app, store):
+    assert store.search_index.search("company 11").tolist() == []
+
+    store.extend(connection_fields(app, range(10, 12)))
+
+    assert store.search_index.search("company 11").tolist() == [11]
+    assert len(store.search_index.search("technology")) == 6
+
+
+def test_search_index_posts_each_row_once_per_token(app):
+    store = app.ConnectionStore()
+    fields = connection_fields(app, range(4))
+    # The same token in several fields of a row, and repeated values across rows
+    fields["company"] = ["Acme Data", "Acme", "Data Acme", "Other"]
+    fields["role"] = ["Data Lead", "Acme Engineer", "Engineer", "Data"]
+    store.extend(fields)
+
+    index = store.search_index
+    index.refresh()
+    assert list(index.postings["acme"]) == [0, 1, 2]
+    assert list(index.postings["data"]) == [0, 2, 3]
+    assert list(index.postings["engineer"]) == [1, 2]
+
+
+def test_goal_mask_matches_terms_inside_field_tokens(app, store):
+    # "nolog" is inside "technology", and custom goal terms match anywhere in a token
+    assert store.goal_index.mask(["nolog"]).tolist() == [i % 2 == 1 for i in range(10)]
+    assert store.goal_index.matching_tokens(["nolog", "financ"]) == {"technology", "finance"}
+
+
+def test_goal_mask_sees_connections_added_after_first_use(app, store):
+    assert store.goal_index.mask(["company"]).sum() == 10
+
+    store.extend(connection_fields(app, range(10, 13)))
+
+    assert store.goal_index.mask(["company"]).sum() == 13
+    assert store.goal_index.mask(["12"]).tolist() == [False] * 12 + [True]
@@ -0,0 +1,41 @@
+import io
+
+import pytest
+
+HEADER = "First Name,Last Name,Email Address,Company,Position,Connected On\n"
+
+
+def connections_csv(rows, encoding="utf-8"):
+    return io.BytesIO((HEADER + "".join(rows)).encode(encoding))
+
+
+def ascii_rows(app, count=None):
+    row = "Ada,Lovelace,ada@example.com,Analytical Engines,Software Engineer,01 Jan 2024\n"
+    return [row] * (count or app.CSV_SNIFF_BYTES // len(row) + 10)
+
+
+def test_latin1_after_sniff_window_is_decoded(app, session):
+    upload = connections_csv(ascii_rows(app) + ["José,Núñez,jose@example.com,Café Olé,Data Analyst,02 Jan 2024\n"], "latin-1")
+
+    assert app.sniff_csv_format(upload)["encoding"] == "latin-1"
+    connections = app.process_connections_csv(upload)
+
+    last = connections[len(connections) - 1]
+    assert (last["firstName"], last["lastName"], last["company"]) == ("José", "Núñez", "Café Olé")
+
+
+def test_utf8_after_sniff_window_stays_utf8(app, session):
+    upload = connections_csv(ascii_rows(app) + ["José,Núñez,jose@example.com,Café Olé,Data Analyst,02 Jan 2024\n"])
+
+    assert app.sniff_csv_format(upload)["encoding"] == "utf-8"
+    connections = app.process_connections_csv(upload)
+
+    assert connections[len(connections) - 1]["company"] == "Café Olé"
+
+
+@pytest.mark.parametrize("encoding, expected", [("utf-8", "utf-8"), ("latin-1", "latin-1"), ("utf-8-sig", "utf-8-sig")])
+def test_small_file_encoding(app, encoding, expected):
+    upload = connections_csv(ascii_rows(app, 3) + ["José,Núñez,jose@example.com,Café,Analyst,02 Jan 2024\n"], encoding)
+
+    assert app.sniff_csv_format(upload)["encoding"] == expected
+    assert upload.tell() == 0
@@ -0,0 +1,82 @@
+import pytest
+
+from conftest import claude_message
+
+
+def analysis(**fields):
+    valid = {
+        "overallScore": 82,
+        "strengths": ["Specific reference to their work", "Clear ask"],
+        "weaknesses": ["Slightly long"],
+        "suggestions": ["Trim the opening"],
+        "assessment": "A solid, personal message.",
+    }
+    valid.update(fields)
+    return valid
+
+
+def test_valid_analysis_passes(app):
+    assert app.validate_message_analysis(analysis()) == analysis()
+
+
+def test_whole_float_score_is_an_integer(app):
+    assert app.validate_message_analysis(analysis(overallScore=82.0))["overallScore"] == 82
+
+
+@pytest.mark.parametrize("fields", [
+    {"overallScore": 82.5},
+    {"overallScore": True},
+    {"overallScore": "82"},
+    {"overallScore": 101},
+    {"overallScore": -1},
+    {"suggestions": "Trim the opening"},
+    {"weaknesses": [1]},
+    {"assessment": None},
+    {"extra": "field"},
+])
+def test_analysis_outside_schema_is_rejected(app, fields):
+    with pytest.raises(ValueError):
+        app.validate_message_analysis(analysis(**fields))
+
+
+def test_long_lists_are_trimmed_to_schema_limits(app):
+    trimmed = app.validate_message_analysis(analysis(
+        strengths=["One", "Two", "Three", "Four", "Five"],
+        weaknesses=["One", "Two", "Three", "Four"],
+        suggestions=[],
+    ))
+
+    assert trimmed["strengths"] == ["One", "Two", "Three", "Four"]
+    assert trimmed["weaknesses"] == ["One", "Two", "Three"]
+    assert trimmed["suggestions"] == []
+
+
+def test_short_lists_are_kept(app):
+    assert app.validate_message_analysis(analysis(strengths=["Only one"]))["strengths"] == ["Only one"]
+
+
+def test_missing_field_is_rejected(app):
+    incomplete = analysis()
+    del incomplete["assessment"]
+    with pytest.raises(ValueError):
+        app.validate_message_analysis(incomplete)
+
+
+def test_overlong_analysis_from_claude_is_shown_trimmed(app, session, fake_claude, breaker, contacts):
+    tool = app.MESSAGE_ANALYSIS_TOOL["name"]
+    fake_claude.respond = lambda body: claude_message(tool_name=tool, tool_input=analysis(strengths=["A", "B", "C", "D", "E"]))
+    session.analysis_parse_failures = 0
+
+    result = app.analyze_message_with_claude("A message with five strengths.", contacts[0])
+
+    assert result["strengths"] == ["A", "B", "C", "D"]
+    assert session.analysis_parse_failures == 0
+
+
+def test_structurally_invalid_analysis_counts_as_parse_failure(app, session, fake_claude, breaker, contacts):
+    tool = app.MESSAGE_ANALYSIS_TOOL["name"]
+    fake_claude.respond = lambda body: claude_message(tool_name=tool, tool_input=analysis(overallScore="high"))
+    session.analysis_parse_failures = 0
+
+    assert app.analyze_message_with_claude("A message scored in words.", contacts[0]) is None
+    assert session.analysis_parse_failures == 1
@@ -0,0 +1,43 @@
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def owner(session):
+    session.batch_owner_id = uuid.uuid4().hex
+    return session
+
+
+def submit_and_collect(app, contacts):
+    batch_id = app.submit_message_batch(contacts)
+    assert app.poll_message_batch(batch_id)["collected"]
+    return batch_id
+
+
+def test_later_batch_keeps_earlier_messages_for_the_same_rows(app, owner, fake_claude, contacts):
+    first = submit_and_collect(app, contacts[:3])
+    second = submit_and_collect(app, contacts[:3])
+
+    assert [batch["id"] for batch in app.load_message_batches()] == [first, second]
+    rows = app.load_batch_messages()
+    assert [row["Batch"] for row in rows] == [first] * 3 + [second] * 3
+    assert all(row["Source"] == "Claude AI (batch)" and row["Batch"] in row["Message"] for row in rows)
+
+
+def test_batches_are_private_to_their_owner(app, owner, fake_claude, contacts):
+    batch_id = submit_and_collect(app, contacts[:3])
+
+    owner.batch_owner_id = uuid.uuid4().hex
+    assert app.load_message_batches() == []
+    assert app.load_batch_messages() == []
+    with pytest.raises(Exception, match="Unknown message batch"):
+        app.poll_message_batch(batch_id)
+
+
+def test_batches_are_scoped_to_the_api_key(app, owner, fake_claude, contacts):
+    submit_and_collect(app, contacts[:3])
+
+    owner.CLAUDE_API_KEY = "another-key"
+    assert app.load_message_batches() == []
+    assert app.load_batch_messages() == []
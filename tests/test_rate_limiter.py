@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+import pytest
+
+REQUEST = {"system": "s" * 400, "messages": [{"role": "user", "content": "m" * 3600}], "max_tokens": 500}
+
+
+@pytest.fixture
+def limiter(app):
+    return app.ClaudeRateLimiter(60, 10000, 10000)
+
+
+def remaining_input(limiter):
+    bucket = limiter.buckets["input"]
+    return bucket.capacity - bucket.tokens
+
+
+def test_settle_charges_prompt_cache_tokens(limiter):
+    reservation = limiter.acquire(REQUEST)
+    usage = SimpleNamespace(input_tokens=100, cache_creation_input_tokens=600, cache_read_input_tokens=200, output_tokens=50)
+
+    limiter.settle(reservation, usage)
+
+    assert remaining_input(limiter) == 900
+
+
+def test_settle_handles_usage_without_cache_fields(limiter):
+    reservation = limiter.acquire(REQUEST)
+    limiter.settle(reservation, SimpleNamespace(input_tokens=100, cache_creation_input_tokens=None, cache_read_input_tokens=None, output_tokens=50))
+
+    assert remaining_input(limiter) == 100
+
+
+def test_failed_request_is_refunded(limiter):
+    limiter.settle(limiter.acquire(REQUEST))
+
+    assert remaining_input(limiter) == 0
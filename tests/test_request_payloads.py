@@ -0,0 +1,70 @@
+import pytest
+
+EPHEMERAL = {"type": "ephemeral"}
+MESSAGE = "Hi Person, I enjoyed your talk on data platforms and would love to compare notes."
+
+
+@pytest.fixture
+def builders(app):
+    """Each request builder with the static system prompt it should lead with and the tool it should force"""
+    return {
+        "generate": (lambda contact: app.build_message_request(contact), app.MESSAGE_SYSTEM_PROMPT, None),
+        "analyze": (lambda contact: app.build_analysis_request(MESSAGE, contact), app.ANALYSIS_SYSTEM_PROMPT, app.MESSAGE_ANALYSIS_TOOL),
+        "improve": (lambda contact: app.build_improvement_request(MESSAGE, contact), app.IMPROVEMENT_SYSTEM_PROMPT, None),
+        "review": (lambda contact: app.build_review_request(MESSAGE, contact), app.REVIEW_SYSTEM_PROMPT, app.MESSAGE_REVIEW_TOOL),
+    }
+
+
+@pytest.mark.parametrize("kind", ["generate", "analyze", "improve", "review"])
+def test_system_blocks_are_cached_in_order(app, session, contacts, builders, kind):
+    build, system_prompt, _ = builders[kind]
+    system = build(contacts[0])["system"]
+
+    assert [block["type"] for block in system] == ["text", "text"]
+    assert system[0]["text"] == system_prompt
+    assert "SENDER'S GOAL" in system[1]["text"]
+    assert [block["cache_control"] for block in system] == [EPHEMERAL, EPHEMERAL]
+
+
+@pytest.mark.parametrize("kind", ["generate", "analyze", "improve", "review"])
+def test_sender_context_stays_out_of_user_message(app, session, contacts, builders, kind):
+    build, _, _ = builders[kind]
+    request = build(contacts[0])
+
+    assert [message["role"] for message in request["messages"]] == ["user"]
+    content = request["messages"][0]["content"]
+    assert isinstance(content, str)
+    assert "SENDER'S" not in content
+    assert session.user_profile["headline"] not in content
+
+
+@pytest.mark.parametrize("kind", ["generate", "analyze", "improve", "review"])
+def test_cached_prefix_is_shared_across_recipients(app, session, contacts, builders, kind):
+    build, _, _ = builders[kind]
+    first, second = build(contacts[0]), build(contacts[1])
+
+    assert first["system"] == second["system"]
+    assert first.get("tools") == second.get("tools")
+    assert first["messages"] != second["messages"]
+
+
+@pytest.mark.parametrize("kind", ["generate", "analyze", "improve", "review"])
+def test_tool_choice_forces_structured_output(app, session, contacts, builders, kind):
+    build, _, tool = builders[kind]
+    request = build(contacts[0])
+
+    if tool is None:
+        assert "tools" not in request and "tool_choice" not in request
+    else:
+        assert request["tools"] == [tool]
+        assert request["tool_choice"] == {"type": "tool", "name": tool["name"]}
+
+
+def test_sender_context_follows_session(app, session, contacts):
+    session.custom_goal = "Meet data leaders in fintech"
+    system = app.build_message_request(contacts[0])["system"]
+
+    assert "Meet data leaders in fintech" in system[1]["text"]
+    assert session.user_profile["summary"] in system[1]["text"]
+    # The analysis only needs the goal, so the sender's profile is left out of its context
+    assert "SENDER'S PROFILE" not in app.build_analysis_request(MESSAGE, contacts[0])["system"][1]["text"]